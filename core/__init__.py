@@ -19,7 +19,7 @@ from .actions import DiaryGeneratorAction
 from .scheduler import DiaryScheduler, EmotionAnalysisTool
 from .commands import DiaryManageCommand
 from .image_processor import ImageProcessor, ImageData
-from .utils import ChatIdResolver, DiaryConstants, MockChatStream, format_date_str
+from .utils import ChatIdResolver, DiaryConstants, MockChatStream, MOCK_CHAT_STREAM, format_date_str
 
 # 定义公开的API接口
 __all__ = [
@@ -40,6 +40,7 @@ __all__ = [
     'ChatIdResolver',
     'DiaryConstants',
     'MockChatStream',
+    'MOCK_CHAT_STREAM',
     'format_date_str','EmotionAnalysisTool',
 ]
 
@@ -27,6 +27,8 @@ import datetime
 import time
 import random
 import re
+from collections import Counter
+from operator import attrgetter
 from typing import List, Tuple, Dict, Any, Optional
 from openai import AsyncOpenAI
 
@@ -43,96 +45,122 @@ from src.plugin_system.apis import (
 )
 
 from .storage import DiaryStorage, DiaryQzoneAPI
-from .utils import ChatIdResolver, DiaryConstants, get_bot_personality
+from .utils import ChatIdResolver, format_date_str, run_with_thread_db_cleanup, MIN_MESSAGE_COUNT, TOKEN_LIMIT_50K, MAX_DIARY_LENGTH, GROUP_PREFIX, PRIVATE_PREFIX, TIMELINE_HOUR_HEADERS, WEATHER_HAPPY_WORDS, WEATHER_SAD_WORDS, WEATHER_ANGRY_WORDS
 from .diary_service import DiaryService
+from .image_processor import ImageProcessor
 
 logger = get_logger("diary_actions")
 
+# 指定聊天列表时并发获取消息的最大并发数，避免同时向数据库发起过多查询
+MESSAGE_FETCH_CONCURRENCY = 8
+
+# 批量生成多天日记时的最大并发数，主要受模型接口的并发/限流约束
+DIARY_GENERATION_CONCURRENCY = 3
+
+# token估算使用的连续中文字符段匹配（预编译；按段匹配再累加长度，避免为每个汉字生成一个字符串）
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]+')
+
+
+async def _query_chat_messages(chat_id: str, start_time: float, end_time: float) -> List[Any]:
+    """
+    在工作线程中查询单个聊天指定时间范围内的全部消息（包含Bot消息和命令消息）
+    
+    只把数据库查询放到工作线程：chat_api的stream查找会遍历宿主共享的streams字典，
+    必须在事件循环线程中完成后再传入chat_id。查询结束后关闭工作线程自己的peewee连接。
+    """
+    return await asyncio.to_thread(
+        run_with_thread_db_cleanup,
+        message_api.get_messages_by_time_in_chat,
+        chat_id=chat_id,
+        start_time=start_time,
+        end_time=end_time,
+        limit=0,
+        limit_mode="earliest",
+        filter_mai=False,
+        filter_command=False
+    )
+
 
 class OptimizedMessageFetcher:
     """优化的消息获取器，智能选择最适合的API"""
     
-    def get_messages_by_config(self, configs: List[str], start_time: float, end_time: float) -> List[Any]:
-        """根据配置智能选择最适合的API获取消息"""
-        all_messages = []
+    # 群号 -> stream_id 缓存（类级别共享：过滤系统每次生成都会新建实例）
+    _group_chat_ids: Dict[str, str] = {}
+    
+    def _get_group_chat_id(self, group_qq: str) -> Optional[str]:
+        """获取群聊的stream_id，命中缓存时不再查询chat_api"""
+        chat_id = self._group_chat_ids.get(group_qq)
+        if chat_id is None:
+            stream = chat_api.get_stream_by_group_id(group_qq)
+            if not stream:
+                return None
+            chat_id = stream.stream_id
+            self._group_chat_ids[group_qq] = chat_id
+        return chat_id
+    
+    def _invalidate_group_chat_id(self, group_qq: str):
+        """丢弃群聊的stream_id缓存，下次获取时重新查询"""
+        self._group_chat_ids.pop(group_qq, None)
+    
+    async def get_messages_by_config(self, configs: List[str], start_time: float, end_time: float) -> List[Any]:
+        """根据配置智能选择最适合的API获取消息，各聊天的数据库查询放到工作线程中并发执行"""
         private_qqs, group_qqs = self._parse_configs(configs)
+        semaphore = asyncio.Semaphore(MESSAGE_FETCH_CONCURRENCY)
         
-        # 私聊：使用 chat_api.get_stream_by_user_id + get_messages_by_time_in_chat，获取完整对话（包含Bot回复）
-        if private_qqs:
-            private_messages = self._get_private_messages_optimized(private_qqs, start_time, end_time)
-            all_messages.extend(private_messages)
+        async def _fetch(getter, qq: str) -> List[Any]:
+            async with semaphore:
+                return await getter(qq, start_time, end_time)
         
+        # 私聊：使用 chat_api.get_stream_by_user_id + get_messages_by_time_in_chat，获取完整对话（包含Bot回复）
         # 群聊：使用改进的chat_id解析 + get_messages_by_time_in_chat
-        if group_qqs:
-            group_messages = self._get_group_messages_optimized(group_qqs, start_time, end_time)
-            all_messages.extend(group_messages)
+        results = await asyncio.gather(
+            *(_fetch(self._get_private_chat_messages, user_qq) for user_qq in private_qqs),
+            *(_fetch(self._get_group_chat_messages, group_qq) for group_qq in group_qqs)
+        )
         
-        return sorted(all_messages, key=lambda x: x.time)
+        all_messages = [msg for messages in results for msg in messages]
+        return sorted(all_messages, key=attrgetter('time'))
     
-    def _get_private_messages_optimized(self, qq_numbers: List[str], start_time: float, end_time: float) -> List[Any]:
+    async def _get_private_chat_messages(self, user_qq: str, start_time: float, end_time: float) -> List[Any]:
         """通过QQ号获取私聊消息（包含Bot回复，严格遵守黑白名单）"""
-        all_private_messages = []
-        
-        for user_qq in qq_numbers:
-            try:
-                # 1. 精确定位私聊流（严格按用户ID匹配）
-                private_stream = chat_api.get_stream_by_user_id(user_qq)
-                if not private_stream:
-                    logger.warning(f"未找到用户{user_qq}的私聊流，跳过")
-                    continue
-                
-                chat_id = private_stream.stream_id
-                
-                # 2. 获取该私聊中的完整对话（包括Bot回复）
-                messages = message_api.get_messages_by_time_in_chat(
-                    chat_id=chat_id,
-                    start_time=start_time,
-                    end_time=end_time,
-                    limit=0,
-                    limit_mode="earliest",
-                    filter_mai=False,  # 关键：包含Bot消息
-                    filter_command=False
-                )
-                
-                all_private_messages.extend(messages)
-                logger.info(f"[完美获取] 私聊{user_qq} -> {chat_id} 获取到{len(messages)}条消息（包含Bot回复）")
-                
-            except Exception as e:
-                logger.error(f"获取私聊{user_qq}消息失败: {e}")
-        
-        return all_private_messages
+        try:
+            # 1. 精确定位私聊流（严格按用户ID匹配；在事件循环线程中查找）
+            private_stream = chat_api.get_stream_by_user_id(user_qq)
+            if not private_stream:
+                logger.warning(f"未找到用户{user_qq}的私聊流，跳过")
+                return []
+            
+            chat_id = private_stream.stream_id
+            
+            # 2. 获取该私聊中的完整对话（包括Bot回复）
+            messages = await _query_chat_messages(chat_id, start_time, end_time)
+            
+            logger.info(f"[完美获取] 私聊{user_qq} -> {chat_id} 获取到{len(messages)}条消息（包含Bot回复）")
+            return messages
+            
+        except Exception as e:
+            logger.error(f"获取私聊{user_qq}消息失败: {e}")
+            return []
     
-    def _get_group_messages_optimized(self, group_qqs: List[str], start_time: float, end_time: float) -> List[Any]:
+    async def _get_group_chat_messages(self, group_qq: str, start_time: float, end_time: float) -> List[Any]:
         """通过群号获取群聊消息，纯API实现"""
-        all_group_messages = []
-        
-        for group_qq in group_qqs:
-            try:
-                # 使用chat_api获取群聊的stream_id
-                stream = chat_api.get_stream_by_group_id(group_qq)
-                if not stream:
-                    logger.warning(f"无法获取群聊{group_qq}的stream信息")
-                    continue
-                
-                chat_id = stream.stream_id
-                
-                # 使用 message_api 获取消息
-                messages = message_api.get_messages_by_time_in_chat(
-                    chat_id=chat_id,
-                    start_time=start_time,
-                    end_time=end_time,
-                    limit=0,
-                    limit_mode="earliest",
-                    filter_mai=False,
-                    filter_command=False
-                )
-                
-                all_group_messages.extend(messages)
-                logger.debug(f"[优化获取] 群聊{group_qq} -> {chat_id} 获取到{len(messages)}条消息")
-                
-            except Exception as e:
-                logger.error(f"获取群聊{group_qq}消息失败: {e}")
-        return all_group_messages
+        try:
+            # 获取群聊的stream_id（优先使用缓存；在事件循环线程中查找）
+            chat_id = self._get_group_chat_id(group_qq)
+            if not chat_id:
+                logger.warning(f"无法获取群聊{group_qq}的stream信息")
+                return []
+            
+            # 使用 message_api 获取消息
+            messages = await _query_chat_messages(chat_id, start_time, end_time)
+            
+            logger.debug(f"[优化获取] 群聊{group_qq} -> {chat_id} 获取到{len(messages)}条消息")
+            return messages
+            
+        except Exception as e:
+            self._invalidate_group_chat_id(group_qq)
+            logger.error(f"获取群聊{group_qq}消息失败: {e}")
+            return []
     
     def _is_private_message(self, msg: Any) -> bool:
         """判断是否为私聊消息"""
@@ -156,19 +184,9 @@ class OptimizedMessageFetcher:
             return True  # 出错时默认认为是私聊
     
     def _parse_configs(self, configs: List[str]) -> Tuple[List[str], List[str]]:
-        """解析配置，分离私聊和群聊"""
-        private_qqs = []
-        group_qqs = []
-        
-        for config in configs:
-            if config.startswith('private:'):
-                private_qqs.append(config[8:])  # 去掉'private:'前缀
-            elif config.startswith('group:'):
-                group_qqs.append(config[6:])  # 去掉'group:'前缀
-            else:
-                # 默认作为群聊处理
-                group_qqs.append(config)
-        
+        """解析配置，分离私聊和群聊（无前缀的配置默认作为群聊处理）"""
+        private_qqs = [c.removeprefix(PRIVATE_PREFIX) for c in configs if c.startswith(PRIVATE_PREFIX)]
+        group_qqs = [c.removeprefix(GROUP_PREFIX) for c in configs if not c.startswith(PRIVATE_PREFIX)]
         return private_qqs, group_qqs
 
 
@@ -178,7 +196,7 @@ class SmartFilterSystem:
     def __init__(self):
         self.fetcher = OptimizedMessageFetcher()
     
-    def apply_filter_mode(self, filter_mode: str, configs: List[str], start_time: float, end_time: float) -> List[Any]:
+    async def apply_filter_mode(self, filter_mode: str, configs: List[str], start_time: float, end_time: float) -> List[Any]:
         """应用过滤模式，智能选择最佳策略"""
         if filter_mode == "whitelist":
             if not configs:
@@ -186,7 +204,7 @@ class SmartFilterSystem:
                 logger.info("[智能过滤] 白名单为空，返回空消息列表")
                 return []
             logger.debug(f"[智能过滤] 白名单模式，处理{len(configs)}个配置")
-            return self.fetcher.get_messages_by_config(configs, start_time, end_time)
+            return await self.fetcher.get_messages_by_config(configs, start_time, end_time)
         elif filter_mode == "blacklist":
             if not configs:
                 # 空黑名单：获取所有消息
@@ -224,42 +242,32 @@ class SmartFilterSystem:
     def _filter_excluded_messages(self, all_messages: List[Any], excluded_configs: List[str]) -> List[Any]:
         """过滤掉黑名单中的消息"""
         excluded_privates, excluded_groups = self.fetcher._parse_configs(excluded_configs)
-        filtered_messages = []
-        excluded_count = 0
-        
         # 预先获取所有排除群聊的chat_id
         excluded_chat_ids = set()
         for group_qq in excluded_groups:
             try:
-                # 使用chat_api获取群聊的stream_id
-                stream = chat_api.get_stream_by_group_id(group_qq)
-                if stream:
-                    excluded_chat_ids.add(stream.stream_id)
-                    logger.debug(f"[智能过滤] 黑名单群聊 {group_qq} -> {stream.stream_id}")
+                # 获取群聊的stream_id（优先使用缓存）
+                chat_id = self.fetcher._get_group_chat_id(group_qq)
+                if chat_id:
+                    excluded_chat_ids.add(chat_id)
+                    logger.debug(f"[智能过滤] 黑名单群聊 {group_qq} -> {chat_id}")
             except Exception as e:
                 logger.error(f"获取黑名单群聊{group_qq}的chat_id失败: {e}")
+        excluded_chat_ids = frozenset(excluded_chat_ids)
+        excluded_privates = frozenset(excluded_privates)
+        is_private = self.fetcher._is_private_message
         
-        for msg in all_messages:
-            is_excluded = False
-            
-            # 检查是否为排除的私聊用户
-            if self.fetcher._is_private_message(msg):
+        def _is_excluded(msg: Any) -> bool:
+            # 排除的私聊用户或排除的群聊
+            if is_private(msg):
                 user_id = getattr(msg.user_info, 'user_id', None)
                 if user_id and user_id in excluded_privates:
-                    is_excluded = True
-                    excluded_count += 1
-                    logger.debug(f"[智能过滤] 排除私聊用户 {user_id} 的消息")
-            
-            # 检查是否为排除的群聊
-            if not is_excluded:
-                chat_id = getattr(msg, 'chat_id', None)
-                if chat_id and chat_id in excluded_chat_ids:
-                    is_excluded = True
-                    excluded_count += 1
-                    logger.debug(f"[智能过滤] 排除群聊 {chat_id} 的消息")
-            
-            if not is_excluded:
-                filtered_messages.append(msg)
+                    return True
+            chat_id = getattr(msg, 'chat_id', None)
+            return bool(chat_id) and chat_id in excluded_chat_ids
+        
+        filtered_messages = [msg for msg in all_messages if not _is_excluded(msg)]
+        excluded_count = len(all_messages) - len(filtered_messages)
         
         logger.debug(f"[智能过滤] 黑名单过滤完成:原始{len(all_messages)}条 -> 过滤后{len(filtered_messages)}条，排除{excluded_count}条")
         return filtered_messages
@@ -342,12 +350,25 @@ class DiaryGeneratorAction(BaseAction):
     ]
     associated_types = ["text"]
 
+    # 存储、QQ空间API与聊天ID解析器在所有Action实例间共享：
+    # 宿主每次触发都会新建Action，共享后目录探测只做一次，cookies与解析缓存也能跨次复用
+    _shared_storage: Optional[DiaryStorage] = None
+    _shared_qzone_api: Optional[DiaryQzoneAPI] = None
+    _shared_chat_resolver: Optional[ChatIdResolver] = None
+    
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.storage = DiaryStorage()
-        self.qzone_api = DiaryQzoneAPI()
-        self.diary_service = DiaryService(plugin_config=self.plugin_config)
-        self.chat_resolver = ChatIdResolver()
+        cls = DiaryGeneratorAction
+        if cls._shared_storage is None:
+            cls._shared_storage = DiaryStorage()
+        if cls._shared_qzone_api is None:
+            cls._shared_qzone_api = DiaryQzoneAPI()
+        if cls._shared_chat_resolver is None:
+            cls._shared_chat_resolver = ChatIdResolver()
+        self.storage = cls._shared_storage
+        self.qzone_api = cls._shared_qzone_api
+        self.chat_resolver = cls._shared_chat_resolver
+        self.diary_service = DiaryService(plugin_config=self.plugin_config, storage=self.storage, qzone_api=self.qzone_api)
 
     async def get_daily_messages(self, date: str, target_chats: List[str] = None, end_hour: int = None, end_minute: int = None) -> List[Any]:
         """
@@ -385,15 +406,15 @@ class DiaryGeneratorAction(BaseAction):
             messages = await action.get_daily_messages("2025-01-15", None, 23, 30)
         """
         try:
-            # 计算时间范围
-            date_obj = datetime.datetime.strptime(date, "%Y-%m-%d")
+            # 计算时间范围（fromisoformat为C实现，先规范为补零的YYYY-MM-DD）
+            date_obj = datetime.datetime.fromisoformat(format_date_str(date))
             start_time = date_obj.timestamp()
             
             if end_hour is not None and end_minute is not None:
                 end_time = date_obj.replace(hour=end_hour, minute=end_minute, second=0).timestamp()
             else:
                 current_time = datetime.datetime.now()
-                if current_time.strftime("%Y-%m-%d") == date:
+                if current_time.date() == date_obj.date():
                     end_time = current_time.timestamp()
                 else:
                     end_time = (date_obj + datetime.timedelta(days=1)).timestamp()
@@ -401,22 +422,21 @@ class DiaryGeneratorAction(BaseAction):
             all_messages = []
             
             if target_chats:
-                # 处理指定聊天
-                for chat_id in target_chats:
-                    try:
-                        # 关键:设置 filter_mai=False 来包含Bot消息
-                        messages = message_api.get_messages_by_time_in_chat(
-                            chat_id=chat_id,
-                            start_time=start_time,
-                            end_time=end_time,
-                            limit=0,
-                            limit_mode="earliest",
-                            filter_mai=False,  # 不过滤Bot消息
-                            filter_command=False  # 不过滤命令消息
-                        )
-                        all_messages.extend(messages)
-                    except Exception as e:
-                        logger.error(f"获取聊天 {chat_id} 消息失败: {e}")
+                # 处理指定聊天：已是chat_id无需查找stream，只有数据库查询放到工作线程中并发执行，信号量限制并发数
+                semaphore = asyncio.Semaphore(MESSAGE_FETCH_CONCURRENCY)
+                
+                async def _fetch_one(chat_id: str) -> List[Any]:
+                    async with semaphore:
+                        # 关键:查询包含Bot消息（filter_mai=False）
+                        return await _query_chat_messages(chat_id, start_time, end_time)
+                
+                results = await asyncio.gather(*(_fetch_one(chat_id) for chat_id in target_chats), return_exceptions=True)
+                # 按target_chats顺序合并结果，与逐个获取时的消息顺序一致
+                for chat_id, result in zip(target_chats, results):
+                    if isinstance(result, Exception):
+                        logger.error(f"获取聊天 {chat_id} 消息失败: {result}")
+                    else:
+                        all_messages.extend(result)
             else:
                 # 从配置文件读取聊天配置
                 config_target_chats = self.get_config("schedule.target_chats", [])
@@ -424,7 +444,7 @@ class DiaryGeneratorAction(BaseAction):
                 
                 # 使用新的智能过滤系统
                 filter_system = SmartFilterSystem()
-                all_messages = filter_system.apply_filter_mode(filter_mode, config_target_chats, start_time, end_time)
+                all_messages = await filter_system.apply_filter_mode(filter_mode, config_target_chats, start_time, end_time)
                 
                 # 检查是否为手动命令且配置为空的特殊情况
                 if not all_messages and filter_mode == "whitelist" and not config_target_chats:
@@ -448,41 +468,33 @@ class DiaryGeneratorAction(BaseAction):
                         return []
             
             # 按时间排序
-            all_messages.sort(key=lambda x: x.time)
+            all_messages.sort(key=attrgetter('time'))
             
             # 实现min_messages_per_chat过滤逻辑
-            min_messages_per_chat = self.get_config("diary_generation.min_messages_per_chat", DiaryConstants.MIN_MESSAGE_COUNT)
+            min_messages_per_chat = self.get_config("diary_generation.min_messages_per_chat", MIN_MESSAGE_COUNT)
             logger.debug(f"[过滤调试] min_messages_per_chat配置: {min_messages_per_chat}")
             
             if min_messages_per_chat > 0:
-                # 按聊天ID分组消息
-                chat_message_counts = {}
-                for msg in all_messages:
-                    chat_id = msg.chat_id
-                    if chat_id not in chat_message_counts:
-                        chat_message_counts[chat_id] = []
-                    chat_message_counts[chat_id].append(msg)
+                # 统计各聊天的消息数量
+                chat_message_counts = Counter(msg.chat_id for msg in all_messages)
                 
                 logger.info(f"[过滤调试] 消息按聊天ID分组结果:")
-                for chat_id, messages in chat_message_counts.items():
-                    logger.info(f"[过滤调试] 聊天 {chat_id}: {len(messages)}条消息")
+                for chat_id, count in chat_message_counts.items():
+                    logger.info(f"[过滤调试] 聊天 {chat_id}: {count}条消息")
                 
                 # 过滤出满足最少消息数量要求的聊天
-                filtered_messages = []
-                kept_chats = 0
-                filtered_chats = 0
-                
-                for chat_id, messages in chat_message_counts.items():
-                    if len(messages) >= min_messages_per_chat:
-                        filtered_messages.extend(messages)
-                        kept_chats += 1
-                        logger.debug(f"[过滤调试] 聊天 {chat_id} 保留: {len(messages)}条消息 >= {min_messages_per_chat}")
+                kept_chat_ids = set()
+                for chat_id, count in chat_message_counts.items():
+                    if count >= min_messages_per_chat:
+                        kept_chat_ids.add(chat_id)
+                        logger.debug(f"[过滤调试] 聊天 {chat_id} 保留: {count}条消息 >= {min_messages_per_chat}")
                     else:
-                        filtered_chats += 1
-                        logger.debug(f"[过滤调试] 聊天 {chat_id} 过滤: {len(messages)}条消息 < {min_messages_per_chat}")
+                        logger.debug(f"[过滤调试] 聊天 {chat_id} 过滤: {count}条消息 < {min_messages_per_chat}")
+                kept_chats = len(kept_chat_ids)
+                filtered_chats = len(chat_message_counts) - kept_chats
                 
-                # 重新按时间排序
-                filtered_messages.sort(key=lambda x: x.time)
+                # all_messages已按时间排序，按原顺序筛选即可保持时间顺序，无需重新排序
+                filtered_messages = [msg for msg in all_messages if msg.chat_id in kept_chat_ids]
                 logger.info(f"[过滤调试] 消息过滤结果: 原始{len(all_messages)}条 → 过滤后{len(filtered_messages)}条")
                 logger.info(f"[过滤调试] 聊天过滤结果: 总聊天{len(chat_message_counts)}个 → 保留{kept_chats}个,过滤{filtered_chats}个")
                 return filtered_messages
@@ -517,30 +529,23 @@ class DiaryGeneratorAction(BaseAction):
             weather_options = ["晴", "多云", "阴", "多云转晴"]
             return random.choice(weather_options)
         
-        all_content = " ".join([msg.processed_plain_text or '' for msg in messages])
-        
-        happy_words = ["哈哈", "笑", "开心", "高兴", "棒", "好", "赞", "爱", "喜欢"]
-        sad_words = ["难过", "伤心", "哭", "痛苦", "失望"]
-        angry_words = ["无语", "醉了", "服了", "烦", "气", "怒"]
-        calm_words = ["平静", "安静", "淡定", "还好", "一般"]
+        all_content = " ".join(msg.processed_plain_text or '' for msg in messages)
         
-        happy_count = sum(1 for word in happy_words if word in all_content)
-        sad_count = sum(1 for word in sad_words if word in all_content)
-        angry_count = sum(1 for word in angry_words if word in all_content)
-        calm_count = sum(1 for word in calm_words if word in all_content)
-        
-        if happy_count >= 2:
-            return "晴"
-        elif happy_count >= 1:
+        # 按判定优先级惰性扫描：开心词命中2个即可定为晴，其余类别只需判断是否命中
+        happy_count = 0
+        for word in WEATHER_HAPPY_WORDS:
+            if word in all_content:
+                happy_count += 1
+                if happy_count >= 2:
+                    return "晴"
+        if happy_count >= 1:
             return "多云转晴"
-        elif sad_count >= 1:
+        if any(word in all_content for word in WEATHER_SAD_WORDS):
             return "雨"
-        elif angry_count >= 1:
+        if any(word in all_content for word in WEATHER_ANGRY_WORDS):
             return "阴"
-        elif calm_count >= 1:
-            return "多云"
-        else:
-            return "多云"
+        # 平静词命中与否结果都是多云，无需扫描
+        return "多云"
     
     def get_date_with_weather(self, date: str, weather: str) -> str:
         """
@@ -613,52 +618,44 @@ class DiaryGeneratorAction(BaseAction):
         bot_qq_account = str(config_api.get_global_config("bot.qq_account", ""))
         
         # 初始化图片处理器
-        from .image_processor import ImageProcessor
         image_processor = ImageProcessor()
         
         bot_message_count = 0
         user_message_count = 0
         
+        # 当前整点区间[hour_start, hour_end)，消息已按时间排序，仅跨越整点时才重新计算本地小时
+        hour_start = hour_end = 0.0
+        
         for msg in messages:
-            msg_time = datetime.datetime.fromtimestamp(msg.time)
-            hour = msg_time.hour
-            # 按时间段分组
-            if hour != current_hour:
-                if 6 <= hour < 12:
-                    time_period = f"上午{hour}点"
-                elif 12 <= hour < 18:
-                    time_period = f"下午{hour}点"
-                else:
-                    time_period = f"晚上{hour}点"
-                timeline_parts.append(f"\n【{time_period}】")
-                current_hour = hour
+            msg_time = msg.time
+            if not hour_start <= msg_time < hour_end:
+                hour_dt = datetime.datetime.fromtimestamp(msg_time).replace(minute=0, second=0, microsecond=0)
+                hour_start = hour_dt.timestamp()
+                hour_end = hour_start + 3600
+                # 按时间段分组
+                if hour_dt.hour != current_hour:
+                    current_hour = hour_dt.hour
+                    timeline_parts.append(TIMELINE_HOUR_HEADERS[current_hour])
             
-            # 获取用户信息
-            nickname = msg.user_info.user_nickname or '某人'
-            user_id = str(msg.user_info.user_id)
+            # 判断是否为Bot消息，确定发言人
+            if str(msg.user_info.user_id) == bot_qq_account:
+                speaker = "我"
+                bot_message_count += 1
+            else:
+                speaker = msg.user_info.user_nickname or '某人'
+                user_message_count += 1
             
-            # 判断消息类型并处理
+            # 判断消息类型并处理：每行只做一次格式化，不产生中间字符串
             if image_processor._is_image_message(msg):
                 # 图片消息处理
-                description = image_processor._get_image_description(msg)
-                if user_id == bot_qq_account:
-                    timeline_parts.append(f"我: [图片]{description}")
-                    bot_message_count += 1
-                else:
-                    timeline_parts.append(f"{nickname}: [图片]{description}")
-                    user_message_count += 1
+                timeline_parts.append(f"{speaker}: [图片]{image_processor._get_image_description(msg)}")
             else:
-                # 文本消息处理（保持原有逻辑）
+                # 文本消息处理，长文本截断为50字符并添加省略号
                 content = msg.processed_plain_text or ''
-                if content and len(content) > 50:
-                    content = content[:50] + "..."
-                # 判断是否为Bot消息
-                if user_id == bot_qq_account:
-                    timeline_parts.append(f"我: {content}")
-                    bot_message_count += 1
+                if len(content) > 50:
+                    timeline_parts.append(f"{speaker}: {content[:50]}...")
                 else:
-                    timeline_parts.append(f"{nickname}: {content}")
-                    user_message_count += 1
+                    timeline_parts.append(f"{speaker}: {content}")
         
         # 存储统计信息
         self._timeline_stats = {
@@ -671,10 +668,8 @@ class DiaryGeneratorAction(BaseAction):
 
     def _estimate_tokens(self, text: str) -> int:
         """估算文本的token数量"""
-        import re
-        
         # 中文字符数
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
+        chinese_chars = sum(map(len, _CJK_RE.findall(text)))
         # 其他字符数
         other_chars = len(text) - chinese_chars
         # 中文约1.5字符=1token,英文约4字符=1token
@@ -715,11 +710,10 @@ class DiaryGeneratorAction(BaseAction):
         # 智能截断,保持语句完整
         truncated = timeline[:target_length]
         
-        # 找到最后一个完整句子
-        for i in range(len(truncated) - 1, len(truncated) // 2, -1):  # 1为偏移量，2为半分除数
-            if truncated[i] in ['。', '！', '？', '\n']:
-                truncated = truncated[:i+1]
-                break
+        # 找到后半段中最后一个完整句子（rfind为C层扫描，无需逐字符循环）
+        cut = max(truncated.rfind(c, len(truncated) // 2 + 1) for c in ('。', '！', '？', '\n'))
+        if cut != -1:
+            truncated = truncated[:cut+1]
         
         logger.info(f"时间线截断: {current_tokens}→{self._estimate_tokens(truncated)} tokens")
         return truncated + "\n\n[聊天记录过长,已截断]"
@@ -745,14 +739,15 @@ class DiaryGeneratorAction(BaseAction):
         """
         return self._truncate_messages(timeline, max_tokens)
 
-    def smart_truncate(self, text: str, max_length: int = DiaryConstants.MAX_DIARY_LENGTH) -> str:
+    def smart_truncate(self, text: str, max_length: int = MAX_DIARY_LENGTH) -> str:
         """智能截断文本,保持语句完整性"""
         if len(text) <= max_length:
             return text
         
-        for i in range(max_length - 3, max_length // 2, -1):  # 3为截断后缀长度，2为半分除数
-            if text[i] in ['。', '！', '？', '~']:
-                return text[:i+1]
+        # 在[max_length//2+1, max_length-3]内查找最后一个句末标点，3为截断后缀长度
+        cut = max(text.rfind(c, max_length // 2 + 1, max(max_length - 2, 0)) for c in ('。', '！', '？', '~'))
+        if cut != -1:
+            return text[:cut+1]
         
         return text[:max_length-3] + "..."
 
@@ -847,7 +842,7 @@ class DiaryGeneratorAction(BaseAction):
         """
         try:
             # 默认模型使用50k截断，确保更好的兼容性
-            max_tokens = DiaryConstants.TOKEN_LIMIT_50K
+            max_tokens = TOKEN_LIMIT_50K
             current_tokens = self._estimate_tokens(timeline)
             
             if current_tokens > max_tokens:
@@ -966,12 +961,10 @@ class DiaryGeneratorAction(BaseAction):
             >>>     print(f"生成失败: {result}")
         """
         try:
-            # 1. 获取bot人设
-            personality = await get_bot_personality()
-            # 2. 获取当天消息（使用内置API）
+            # 获取当天消息（使用内置API）；人设由共享服务获取
             messages = await self.get_daily_messages(date, target_chats)
             
-            if len(messages) < self.get_config("diary_generation.min_message_count", DiaryConstants.MIN_MESSAGE_COUNT):
+            if len(messages) < self.get_config("diary_generation.min_message_count", MIN_MESSAGE_COUNT):
                 return False, f"当天消息数量不足({len(messages)}条),无法生成日记"
             
             # 由共享服务负责完整生成逻辑（含token截断/模型选择/保存）
@@ -984,8 +977,8 @@ class DiaryGeneratorAction(BaseAction):
             max_length = self.get_config("qzone_publishing.qzone_max_word_count", 350)
             if not isinstance(max_length, int):
                 max_length = 350
-            if max_length > DiaryConstants.MAX_DIARY_LENGTH:
-                max_length = DiaryConstants.MAX_DIARY_LENGTH
+            if max_length > MAX_DIARY_LENGTH:
+                max_length = MAX_DIARY_LENGTH
             if len(diary_content) > max_length:
                 diary_content = self.smart_truncate(diary_content, max_length)
             
@@ -1013,6 +1006,34 @@ class DiaryGeneratorAction(BaseAction):
             
             return False, f"生成日记时出错: {str(e)}"
 
+    async def generate_diaries(self, dates: List[str], target_chats: List[str] = None) -> List[Tuple[bool, str]]:
+        """
+        并发生成多天的日记
+        
+        各日期的消息获取与模型调用互不依赖，耗时主要在等待模型响应，
+        因此并发执行generate_diary，由信号量限制同时进行的生成数量。
+        
+        Args:
+            dates (List[str]): 要生成日记的日期列表，格式为YYYY-MM-DD
+            target_chats (List[str], optional): 指定的聊天ID列表，为None时使用配置
+        
+        Returns:
+            List[Tuple[bool, str]]: 与dates顺序一致的(是否成功, 日记内容或错误信息)列表
+        
+        Examples:
+            >>> results = await action.generate_diaries(["2025-01-14", "2025-01-15"])
+            >>> for date, (success, result) in zip(dates, results):
+            >>>     print(date, success)
+        """
+        semaphore = asyncio.Semaphore(DIARY_GENERATION_CONCURRENCY)
+        
+        async def _generate_one(date: str) -> Tuple[bool, str]:
+            async with semaphore:
+                return await self.generate_diary(date, target_chats)
+        
+        # generate_diary内部已捕获异常并返回失败信息，这里无需return_exceptions
+        return list(await asyncio.gather(*(_generate_one(date) for date in dates)))
+
     async def execute(self) -> Tuple[bool, str]:
         """
         执行日记生成
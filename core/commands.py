@@ -29,7 +29,7 @@ from src.plugin_system.apis import config_api, message_api, get_logger
 
 from .storage import DiaryStorage
 from .diary_service import DiaryService
-from .utils import ChatIdResolver, DiaryConstants, MockChatStream, format_date_str, get_bot_personality, style_send
+from .utils import ChatIdResolver, MockChatStream, format_date_str, get_bot_personality, style_send, MIN_MESSAGE_COUNT, TOKEN_LIMIT_50K, MAX_DIARY_LENGTH
 
 logger = get_logger("diary_commands")
 
@@ -272,27 +272,28 @@ class DiaryManageCommand(BaseCommand):
             # 计算上周开始时间
             last_week_start = week_start - datetime.timedelta(days=7)
             
-            # 过滤本周和上周的日记
-            this_week_diaries = []
-            last_week_diaries = []
+            # 单次遍历累计本周和上周的篇数、字数和发布成功数（按时间戳比较，不逐条构造datetime）
+            week_start_ts = week_start.timestamp()
+            last_week_start_ts = last_week_start.timestamp()
+            this_week_count = this_week_words = this_week_success = 0
+            last_week_count = last_week_words = 0
             
             for diary in diaries:
-                diary_time = datetime.datetime.fromtimestamp(diary.get('generation_time', 0))
-                if diary_time >= week_start:
-                    this_week_diaries.append(diary)
-                elif diary_time >= last_week_start and diary_time < week_start:
-                    last_week_diaries.append(diary)
+                generation_time = diary.get('generation_time', 0)
+                if generation_time >= week_start_ts:
+                    this_week_count += 1
+                    this_week_words += diary.get("word_count", 0)
+                    if diary.get("is_published_qzone", False):
+                        this_week_success += 1
+                elif generation_time >= last_week_start_ts:
+                    last_week_count += 1
+                    last_week_words += diary.get("word_count", 0)
             
             # 计算本周统计
-            this_week_count = len(this_week_diaries)
-            this_week_words = sum(diary.get("word_count", 0) for diary in this_week_diaries)
             this_week_avg = this_week_words // this_week_count if this_week_count > 0 else 0
-            this_week_success = sum(1 for diary in this_week_diaries if diary.get("is_published_qzone", False))
             this_week_success_rate = (this_week_success / this_week_count * 100) if this_week_count > 0 else 0
             
             # 计算上周统计
-            last_week_count = len(last_week_diaries)
-            last_week_words = sum(diary.get("word_count", 0) for diary in last_week_diaries)
             last_week_avg = last_week_words // last_week_count if last_week_count > 0 else 0
             
             # 计算趋势
@@ -818,7 +819,7 @@ class DiaryManageCommand(BaseCommand):
             timeline = diary_action.build_chat_timeline(messages)
             
             # 3. 强制50k截断
-            max_tokens = DiaryConstants.TOKEN_LIMIT_50K
+            max_tokens = TOKEN_LIMIT_50K
             current_tokens = diary_action.estimate_token_count(timeline)
             if current_tokens > max_tokens:
                 timeline = diary_action.truncate_timeline_by_tokens(timeline, max_tokens)
@@ -837,8 +838,8 @@ class DiaryManageCommand(BaseCommand):
                 max_wc = 350
             if min_wc < 20:
                 min_wc = 20
-            if max_wc > DiaryConstants.MAX_DIARY_LENGTH:
-                max_wc = DiaryConstants.MAX_DIARY_LENGTH
+            if max_wc > MAX_DIARY_LENGTH:
+                max_wc = MAX_DIARY_LENGTH
             if max_wc < min_wc:
                 max_wc = min_wc
             target_length = random.randint(min_wc, max_wc)
@@ -926,8 +927,8 @@ class DiaryManageCommand(BaseCommand):
             max_length = diary_action.get_config("qzone_publishing.qzone_max_word_count", 350)
             if not isinstance(max_length, int):
                 max_length = 350
-            if max_length > DiaryConstants.MAX_DIARY_LENGTH:
-                max_length = DiaryConstants.MAX_DIARY_LENGTH
+            if max_length > MAX_DIARY_LENGTH:
+                max_length = MAX_DIARY_LENGTH
             if len(diary_content) > max_length:
                 diary_content = diary_action.smart_truncate(diary_content, max_length)
             
@@ -1039,7 +1040,7 @@ class DiaryManageCommand(BaseCommand):
                     messages, context_desc = await self._get_messages_with_context_detection(date)
                     logger.info(f"generate指令环境检测: {context_desc}, 获取到{len(messages)}条消息")
                     
-                    min_message_count = DiaryConstants.MIN_MESSAGE_COUNT  # 硬编码最少消息数
+                    min_message_count = MIN_MESSAGE_COUNT  # 硬编码最少消息数
                     if len(messages) < min_message_count:
                         await self.send_text(f"❌ {date} {context_desc} 消息数量不足({len(messages)}条),无法生成日记")
                         return False, "消息数量不足", True
@@ -1081,13 +1082,30 @@ class DiaryManageCommand(BaseCommand):
                     diaries = await self.storage.list_diaries(limit=0)
                     
                     if diaries:
+                        # 单次遍历统计发布数、日期、最长/最短日记和最近生成时间
+                        success_count = 0
+                        dates = []
+                        max_diary = min_diary = diaries[0]
+                        max_words = min_words = diaries[0].get('word_count', 0)
+                        latest_ts = diaries[0].get('generation_time', 0)
+                        for diary in diaries:
+                            if diary.get("is_published_qzone", False):
+                                success_count += 1
+                            date = diary.get("date")
+                            if date:
+                                dates.append(date)
+                            word_count = diary.get('word_count', 0)
+                            if word_count > max_words:
+                                max_diary, max_words = diary, word_count
+                            if word_count < min_words:
+                                min_diary, min_words = diary, word_count
+                            latest_ts = max(latest_ts, diary.get('generation_time', 0))
+                        
                         # 计算发布统计
-                        success_count = sum(1 for diary in diaries if diary.get("is_published_qzone", False))
                         failed_count = len(diaries) - success_count
-                        success_rate = (success_count / len(diaries) * 100) if diaries else 0
+                        success_rate = success_count / len(diaries) * 100
                         
                         # 计算日期范围
-                        dates = [diary.get("date", "") for diary in diaries if diary.get("date")]
                         dates.sort()
                         if len(dates) > 1:
                             date_range = f"{dates[0]} ~ {dates[-1]}"
@@ -1096,11 +1114,7 @@ class DiaryManageCommand(BaseCommand):
                         else:
                             date_range = "无"
                         
-                        # 计算最长最短日记
-                        max_diary = max(diaries, key=lambda x: x.get('word_count', 0))
-                        min_diary = min(diaries, key=lambda x: x.get('word_count', 0))
-                        
-                        latest_time = datetime.datetime.fromtimestamp(max(diaries, key=lambda x: x.get('generation_time', 0)).get('generation_time', 0))
+                        latest_time = datetime.datetime.fromtimestamp(latest_ts)
                         
                         # 计算下次定时任务时间
                         next_schedule = await self._get_next_schedule_time()
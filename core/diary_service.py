@@ -13,24 +13,35 @@
 
 import datetime
 import random
+import re
 import time
 from typing import Any, Dict, List, Tuple
 
 from openai import AsyncOpenAI
-from .utils import get_bot_personality,DiaryConstants
+from .utils import (
+    get_bot_personality, TOKEN_LIMIT_50K, MAX_DIARY_LENGTH, TIMELINE_HOUR_HEADERS,
+    WEATHER_HAPPY_WORDS, WEATHER_SAD_WORDS, WEATHER_ANGRY_WORDS,
+)
 from src.plugin_system.apis import config_api, llm_api, get_logger
 
 from .storage import DiaryStorage, DiaryQzoneAPI
+from .image_processor import ImageProcessor
 
 
 logger = get_logger("diary_service")
 
+# token估算使用的连续中文字符段匹配（预编译，按段累加长度）
+_CJK_RE = re.compile(r"[\u4e00-\u9fff]+")
+
 
 class DiaryService:
-    def __init__(self, plugin_config: Dict[str, Any] | None = None) -> None:
+    def __init__(self, plugin_config: Dict[str, Any] | None = None,
+                 storage: DiaryStorage | None = None,
+                 qzone_api: DiaryQzoneAPI | None = None) -> None:
         self.plugin_config = plugin_config or {}
-        self.storage = DiaryStorage()
-        self.qzone_api = DiaryQzoneAPI()
+        # 调用方可传入共享实例，未传入时各自创建
+        self.storage = storage or DiaryStorage()
+        self.qzone_api = qzone_api or DiaryQzoneAPI()
 
     # ===================== 配置访问 =====================
     def get_config(self, key: str, default=None):
@@ -52,46 +63,39 @@ class DiaryService:
         current_hour = -1
         bot_qq_account = str(config_api.get_global_config("bot.qq_account", ""))
 
-        from .image_processor import ImageProcessor
         image_processor = ImageProcessor()
 
         bot_message_count = 0
         user_message_count = 0
 
-        for msg in messages:
-            msg_time = datetime.datetime.fromtimestamp(msg.time)
-            hour = msg_time.hour
-            if hour != current_hour:
-                if 6 <= hour < 12:
-                    time_period = f"上午{hour}点"
-                elif 12 <= hour < 18:
-                    time_period = f"下午{hour}点"
-                else:
-                    time_period = f"晚上{hour}点"
-                timeline_parts.append(f"\n【{time_period}】")
-                current_hour = hour
+        # 当前整点区间[hour_start, hour_end)，仅跨越整点时才重新计算本地小时
+        hour_start = hour_end = 0.0
 
-            nickname = msg.user_info.user_nickname or '某人'
-            user_id = str(msg.user_info.user_id)
+        for msg in messages:
+            msg_time = msg.time
+            if not hour_start <= msg_time < hour_end:
+                hour_dt = datetime.datetime.fromtimestamp(msg_time).replace(minute=0, second=0, microsecond=0)
+                hour_start = hour_dt.timestamp()
+                hour_end = hour_start + 3600
+                if hour_dt.hour != current_hour:
+                    current_hour = hour_dt.hour
+                    timeline_parts.append(TIMELINE_HOUR_HEADERS[current_hour])
+
+            if str(msg.user_info.user_id) == bot_qq_account:
+                speaker = "我"
+                bot_message_count += 1
+            else:
+                speaker = msg.user_info.user_nickname or '某人'
+                user_message_count += 1
 
             if image_processor._is_image_message(msg):
-                description = image_processor._get_image_description(msg)
-                if user_id == bot_qq_account:
-                    timeline_parts.append(f"我: [图片]{description}")
-                    bot_message_count += 1
-                else:
-                    timeline_parts.append(f"{nickname}: [图片]{description}")
-                    user_message_count += 1
+                timeline_parts.append(f"{speaker}: [图片]{image_processor._get_image_description(msg)}")
             else:
                 content = msg.processed_plain_text or ''
-                if content and len(content) > 50:
-                    content = content[:50] + "..."
-                if user_id == bot_qq_account:
-                    timeline_parts.append(f"我: {content}")
-                    bot_message_count += 1
+                if len(content) > 50:
+                    timeline_parts.append(f"{speaker}: {content[:50]}...")
                 else:
-                    timeline_parts.append(f"{nickname}: {content}")
-                    user_message_count += 1
+                    timeline_parts.append(f"{speaker}: {content}")
 
         self._timeline_stats = {
             "total_messages": len(messages),
@@ -102,8 +106,7 @@ class DiaryService:
 
     # ===================== Token估算与截断 =====================
     def _estimate_tokens(self, text: str) -> int:
-        import re
-        chinese_chars = len(re.findall(r"[\u4e00-\u9fff]", text))
+        chinese_chars = sum(map(len, _CJK_RE.findall(text)))
         other_chars = len(text) - chinese_chars
         return int(chinese_chars / 1.5 + other_chars / 4)
 
@@ -117,49 +120,43 @@ class DiaryService:
         ratio = max_tokens / current_tokens
         target_length = int(len(timeline) * ratio * 0.95)
         truncated = timeline[:target_length]
-        for i in range(len(truncated) - 1, len(truncated) // 2, -1):
-            if truncated[i] in ['。', '！', '？', '\n']:
-                truncated = truncated[: i + 1]
-                break
+        cut = max(truncated.rfind(c, len(truncated) // 2 + 1) for c in ('。', '！', '？', '\n'))
+        if cut != -1:
+            truncated = truncated[: cut + 1]
         logger.info(f"时间线截断: {current_tokens}→{self._estimate_tokens(truncated)} tokens")
         return truncated + "\n\n[聊天记录过长,已截断]"
 
     def truncate_timeline_by_tokens(self, timeline: str, max_tokens: int) -> str:
         return self._truncate_messages(timeline, max_tokens)
 
-    def smart_truncate(self, text: str, max_length: int = DiaryConstants.MAX_DIARY_LENGTH) -> str:
+    def smart_truncate(self, text: str, max_length: int = MAX_DIARY_LENGTH) -> str:
         if len(text) <= max_length:
             return text
-        for i in range(max_length - 3, max_length // 2, -1):
-            if text[i] in ['。', '！', '？', '~']:
-                return text[: i + 1]
+        cut = max(text.rfind(c, max_length // 2 + 1, max(max_length - 2, 0)) for c in ('。', '！', '？', '~'))
+        if cut != -1:
+            return text[: cut + 1]
         return text[: max_length - 3] + "..."
 
     # ===================== 天气与日期 =====================
     def get_weather_by_emotion(self, messages: List[Any]) -> str:
         if not messages:
             return random.choice(["晴", "多云", "阴", "多云转晴"])
-        all_content = " ".join([(msg.processed_plain_text or '') for msg in messages])
-        happy_words = ["哈哈", "笑", "开心", "高兴", "棒", "好", "赞", "爱", "喜欢"]
-        sad_words = ["难过", "伤心", "哭", "痛苦", "失望"]
-        angry_words = ["无语", "醉了", "服了", "烦", "气", "怒"]
-        calm_words = ["平静", "安静", "淡定", "还好", "一般"]
-        happy_count = sum(1 for w in happy_words if w in all_content)
-        sad_count = sum(1 for w in sad_words if w in all_content)
-        angry_count = sum(1 for w in angry_words if w in all_content)
-        calm_count = sum(1 for w in calm_words if w in all_content)
-        if happy_count >= 2:
-            return "晴"
-        elif happy_count >= 1:
+        all_content = " ".join(msg.processed_plain_text or '' for msg in messages)
+        # 按判定优先级惰性扫描：开心词命中2个即可定为晴，其余类别只需判断是否命中
+        happy_count = 0
+        for word in WEATHER_HAPPY_WORDS:
+            if word in all_content:
+                happy_count += 1
+                if happy_count >= 2:
+                    return "晴"
+        if happy_count >= 1:
             return "多云转晴"
-        elif sad_count >= 1:
+        if any(word in all_content for word in WEATHER_SAD_WORDS):
             return "雨"
-        elif angry_count >= 1:
+        if any(word in all_content for word in WEATHER_ANGRY_WORDS):
             return "阴"
-        elif calm_count >= 1:
-            return "多云"
-        else:
-            return "多云"
+        # 平静词命中与否结果都是多云，无需扫描
+        return "多云"
 
     def get_date_with_weather(self, date: str, weather: str) -> str:
         try:
@@ -198,13 +195,9 @@ class DiaryService:
             logger.error(f"自定义模型调用失败: {e}")
             return False, f"自定义模型调用出错: {str(e)}"
 
-    async def _generate_with_default_model(self, prompt: str, timeline: str) -> Tuple[bool, str]:
+    async def _generate_with_default_model(self, prompt: str) -> Tuple[bool, str]:
+        # 默认模型的50k截断已在构建prompt前完成（见generate_diary_from_messages）
         try:
-            max_tokens = DiaryConstants.TOKEN_LIMIT_50K
-            current_tokens = self._estimate_tokens(timeline)
-            if current_tokens > max_tokens:
-                truncated = self._truncate_messages(timeline, max_tokens)
-                prompt = prompt.replace(timeline, truncated)
             models = llm_api.get_available_models()
             model = models.get("replyer")
             if not model:
@@ -230,9 +223,13 @@ class DiaryService:
         try:
             personality = await get_bot_personality()
             timeline = self.build_chat_timeline(messages)
+            # 立即取出本次统计：等待模型期间其他日期的生成可能覆盖self._timeline_stats
+            timeline_stats = getattr(self, "_timeline_stats", {}) if messages else {}
 
-            if force_50k:
-                max_tokens = DiaryConstants.TOKEN_LIMIT_50K
+            # 默认模型始终需要50k截断；在构建prompt前完成，避免对整段prompt做子串替换
+            use_custom_model = self.get_config("custom_model.use_custom_model", False)
+            if force_50k or not use_custom_model:
+                max_tokens = TOKEN_LIMIT_50K
                 current_tokens = self.estimate_token_count(timeline)
                 if current_tokens > max_tokens:
                     timeline = self.truncate_timeline_by_tokens(timeline, max_tokens)
@@ -250,8 +247,8 @@ class DiaryService:
                 max_wc = 350
             if min_wc < 20:
                 min_wc = 20
-            if max_wc > DiaryConstants.MAX_DIARY_LENGTH:
-                max_wc = DiaryConstants.MAX_DIARY_LENGTH
+            if max_wc > MAX_DIARY_LENGTH:
+                max_wc = MAX_DIARY_LENGTH
             if max_wc < min_wc:
                 max_wc = min_wc
             target_length = random.randint(min_wc, max_wc)
@@ -317,11 +314,10 @@ class DiaryService:
 不要输出多余内容(包括前后缀，冒号和引号，括号，表情包，at或 @等 )。
 日记内容:"""
 
-            use_custom_model = self.get_config("custom_model.use_custom_model", False)
             if use_custom_model:
                 success, diary_content = await self._generate_with_custom_model(prompt)
             else:
-                success, diary_content = await self._generate_with_default_model(prompt, timeline)
+                success, diary_content = await self._generate_with_default_model(prompt)
 
             if not success or not diary_content:
                 return False, diary_content or "模型生成日记失败"
@@ -330,8 +326,8 @@ class DiaryService:
             max_length = self.get_config("qzone_publishing.qzone_max_word_count", 350)
             if not isinstance(max_length, int):
                 max_length = 350
-            if max_length > DiaryConstants.MAX_DIARY_LENGTH:
-                max_length = DiaryConstants.MAX_DIARY_LENGTH
+            if max_length > MAX_DIARY_LENGTH:
+                max_length = MAX_DIARY_LENGTH
             if len(diary_content) > max_length:
                 diary_content = self.smart_truncate(diary_content, max_length)
 
@@ -341,8 +337,8 @@ class DiaryService:
                 "word_count": len(diary_content),
                 "generation_time": time.time(),
                 "weather": weather,
-                "bot_messages": getattr(self, "_timeline_stats", {}).get("bot_messages", 0),
-                "user_messages": getattr(self, "_timeline_stats", {}).get("user_messages", 0),
+                "bot_messages": timeline_stats.get("bot_messages", 0),
+                "user_messages": timeline_stats.get("user_messages", 0),
                 "is_published_qzone": False,
                 "qzone_publish_time": None,
                 "status": "生成成功",
@@ -2,22 +2,20 @@
 定时任务和工具模块
 
 本模块包含日记插件的定时任务调度器和相关工具类，负责：
-1. 常量定义和配置管理
-2. 模拟聊天流用于定时任务
-3. 情感分析工具实现
-4. 定时任务的调度和执行
+1. 情感分析工具实现
+2. 定时任务的调度和执行
 
 主要组件：
-- DiaryConstants: 插件常量定义
-- MockChatStream: 虚拟聊天流类
 - EmotionAnalysisTool: 情感分析工具
 - DiaryScheduler: 定时任务调度器
+
+注意：DiaryConstants 和 MockChatStream 定义在 utils 模块中（不依赖其它核心模块），
+本模块直接从那里导入，避免循环依赖。
 """
 
 import asyncio
 import datetime
-import time
-from typing import List, Dict, Any
+from typing import Dict, Any, List, Tuple
 
 from src.plugin_system import (
     BaseTool,
@@ -28,12 +26,45 @@ from src.plugin_system.apis import (
 )
 
 # 导入共享的工具类
-from .utils import DiaryConstants, MockChatStream, ChatIdResolver
+from .utils import MOCK_CHAT_STREAM, ChatIdResolver
 from .storage import DiaryStorage
 from .actions import DiaryGeneratorAction
 
 logger = get_logger("diary_plugin.scheduler")
 
+# 定时生成Action的固定标识，模块加载时构造一次
+SCHEDULED_LOG_PREFIX = "[ScheduledDiary]"
+SCHEDULED_THINKING_ID = "scheduled_diary"
+SCHEDULED_REASONING = "定时生成日记"
+
+# 情感关键词表：(情感标签, 触发关键词)，顺序即输出顺序
+EMOTION_KEYWORDS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("开心", ("哈哈", "笑", "开心", "高兴")),
+    ("无语", ("无语", "醉了", "服了")),
+    ("吐槽", ("吐槽", "抱怨", "烦")),
+    ("感动", ("感动", "温暖", "暖心")),
+)
+
+# 最短关键词长度：短于该长度或全为空白的文本不可能命中任何关键词
+EMOTION_MIN_KEYWORD_LEN = min(len(word) for _, words in EMOTION_KEYWORDS for word in words)
+
+
+def scan_emotions(text: str) -> List[str]:
+    """
+    扫描文本中出现的情感标签
+    
+    纯函数关键词匹配内核，不依赖工具实例，可在批量分析时直接复用。
+    
+    Args:
+        text (str): 待分析文本
+    
+    Returns:
+        List[str]: 命中的情感标签，按EMOTION_KEYWORDS顺序排列
+    """
+    if len(text) < EMOTION_MIN_KEYWORD_LEN or text.isspace():
+        return []
+    return [label for label, words in EMOTION_KEYWORDS if any(word in text for word in words)]
+
 
 class EmotionAnalysisTool(BaseTool):
     """
@@ -99,27 +130,18 @@ class EmotionAnalysisTool(BaseTool):
             messages = function_args.get("messages", "")
             analysis_type = function_args.get("analysis_type", "emotion")
             
-            if not messages:
+            if not messages or not isinstance(messages, str):
                 return {"name": self.name, "content": "没有消息内容可分析"}
             
             if analysis_type == "emotion":
-                emotions = []
-                if any(word in messages for word in ["哈哈", "笑", "开心", "高兴"]):
-                    emotions.append("开心")
-                if any(word in messages for word in ["无语", "醉了", "服了"]):
-                    emotions.append("无语")
-                if any(word in messages for word in ["吐槽", "抱怨", "烦"]):
-                    emotions.append("吐槽")
-                if any(word in messages for word in ["感动", "温暖", "暖心"]):
-                    emotions.append("感动")
-                
+                emotions = scan_emotions(messages)
                 result = f"检测到的情感: {', '.join(emotions) if emotions else '平静'}"
             else:
                 result = "聊天主题: 日常对话"
             
             return {"name": self.name, "content": result}
         except Exception as e:
-            logger.error(f"情感分析失败: {e}")
+            logger.error("情感分析失败: %s", e)
             return {"name": self.name, "content": f"分析失败: {str(e)}"}
 
 
@@ -143,8 +165,18 @@ class DiaryScheduler:
     Methods:
         start: 启动定时任务
         stop: 停止定时任务
-        _schedule_loop: 定时任务循环
+        _schedule_next: 计算下次执行时间并注册定时器
+        _on_timer: 定时器回调，派发生成任务
+        _fire_and_reschedule: 执行生成并重新调度
+        _get_diary_action: 获取复用的日记生成Action
         _generate_daily_diary: 生成每日日记
+        reload_config: 重新加载定时配置
+        _reschedule: 按最新配置重新注册定时器
+        _refresh_schedule_config: 检查定时配置是否变更
+        _c: 读取schedule配置项
+        _bind_schedule_section: 绑定当前的schedule配置节
+        _load_schedule_config: 解析并缓存定时配置
+        _resolve_timezone: 解析配置时区
         _get_timezone_now: 获取配置时区的当前时间
     
     Example:
@@ -162,34 +194,165 @@ class DiaryScheduler:
         """
         self.plugin = plugin
         self.is_running = False
-        self.task = None
+        self.task = None  # 正在执行的生成任务
+        self._timer_handle = None  # 事件循环上的定时器句柄
         self.logger = get_logger("DiaryScheduler")
         self.storage = DiaryStorage()
+        self._diary_action = None  # 跨次运行复用的日记生成Action
+        self._loop = None  # 定时器所在的事件循环
+        self._config_ref = None  # 当前绑定的插件配置对象
+        self._cfg_ref = None  # 当前绑定的schedule配置节对象
+        self._cfg = {}
+        self._load_schedule_config()
     
-    def _get_timezone_now(self):
+    def _c(self, key: str, default: Any = None) -> Any:
         """
-        获取配置时区的当前时间
+        读取schedule配置节中的配置项
+        
+        直接从绑定的配置节字典取值，避免逐次解析点分路径；
+        宿主替换了插件配置或schedule配置节（而非原地修改）时按对象身份检测并重新绑定。
+        插件未提供字典形式的配置时回退到plugin.get_config。
+        """
+        config = getattr(self.plugin, "config", None)
+        if not isinstance(config, dict):
+            return self.plugin.get_config(f"schedule.{key}", default)
+        if config is not self._config_ref or config.get("schedule") is not self._cfg_ref:
+            self._bind_schedule_section(config)
+        return self._cfg.get(key, default)
+
+    def _bind_schedule_section(self, config: dict):
+        """
+        绑定当前的schedule配置节
+        
+        插件配置对象本身被替换时同时丢弃缓存的日记生成Action，
+        使其在下一次运行时以新配置重新创建。
+        """
+        if self._config_ref is not None and config is not self._config_ref:
+            self._diary_action = None
+        self._config_ref = config
+        section = config.get("schedule")
+        self._cfg_ref = section
+        self._cfg = section if isinstance(section, dict) else {}
+
+    def _load_schedule_config(self):
+        """
+        解析并缓存定时相关配置
+        
+        绑定schedule配置节，执行时间解析为 datetime.time，时区解析为 tzinfo 对象，
+        同时记录原始配置值，供每次调度前的 _refresh_schedule_config 比对。
+        执行时间格式错误时回退到默认的 23:30。
+        """
+        config = getattr(self.plugin, "config", None)
+        if isinstance(config, dict):
+            self._bind_schedule_section(config)
+        schedule_time_str = self._c("schedule_time", "23:30")
+        self._schedule_time_raw = schedule_time_str
+        try:
+            hour, minute = map(int, schedule_time_str.split(":"))
+            self._target_time = datetime.time(hour, minute)
+        except (ValueError, AttributeError) as e:
+            self.logger.error("执行时间配置无效: %s (%s),使用默认值23:30", schedule_time_str, e)
+            self._target_time = datetime.time(23, 30)
+        self._timezone_raw = self._c("timezone", "Asia/Shanghai")
+        self._tz = self._resolve_timezone()
+
+    def _refresh_schedule_config(self) -> bool:
+        """
+        检查执行时间与时区配置是否已变更
         
-        根据插件配置中的时区设置，返回对应时区的当前时间。
-        如果pytz模块未安装或时区配置错误，则回退到系统时间。
+        只比对两个原始配置值，未变化时不做任何解析；变化时重新解析并缓存。
         
         Returns:
-            datetime.datetime: 当前时间对象
+            bool: 配置是否发生变化
+        """
+        if (self._c("schedule_time", "23:30") == self._schedule_time_raw
+                and self._c("timezone", "Asia/Shanghai") == self._timezone_raw):
+            return False
+        self._load_schedule_config()
+        self.logger.info("定时配置已变更,执行时间: %02d:%02d",
+                         self._target_time.hour, self._target_time.minute)
+        return True
+
+    def reload_config(self):
+        """
+        重新加载定时配置
         
-        Note:
-            默认时区为Asia/Shanghai，需要安装pytz模块支持时区转换
+        插件配置热更新后调用：重新解析执行时间与时区，丢弃缓存的日记生成Action，
+        若定时任务正在运行则按新配置重新注册定时器。
+        可在任意线程调用，定时器的重新注册总是在定时任务所在的事件循环上执行。
+        """
+        self._load_schedule_config()
+        self._diary_action = None
+        if not self.is_running or self._loop is None:
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self._reschedule()
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._reschedule)
+        except RuntimeError:
+            # 事件循环已关闭，无需重新调度
+            pass
+
+    def _reschedule(self):
+        """取消当前定时器并按最新配置重新注册（需在定时任务所在的事件循环中调用）"""
+        if not self.is_running:
+            return
+        if self._timer_handle:
+            self._timer_handle.cancel()
+            self._timer_handle = None
+        # 正在生成时由 _fire_and_reschedule 在结束后按新配置重新调度
+        if self.task is None or self.task.done():
+            self._schedule_next()
+
+    def _resolve_timezone(self):
         """
-        timezone_str = self.plugin.get_config("schedule.timezone", "Asia/Shanghai")
+        解析配置中的时区对象
+        
+        优先使用标准库zoneinfo（Python 3.9+），不可用时回退到pytz。
+        解析失败返回None，表示使用系统时间。
+        
+        Returns:
+            tzinfo | None: 时区对象
+        """
+        timezone_str = self._c("timezone", "Asia/Shanghai")
+        try:
+            from zoneinfo import ZoneInfo
+            return ZoneInfo(timezone_str)
+        except ImportError:
+            pass
+        except Exception as e:
+            self.logger.error("时区处理出错: %s,使用系统时间", e)
+            return None
         try:
             import pytz
-            tz = pytz.timezone(timezone_str)
-            return datetime.datetime.now(tz)
+            return pytz.timezone(timezone_str)
         except ImportError:
             self.logger.error("pytz模块未安装,使用系统时间")
-            return datetime.datetime.now()
         except Exception as e:
-            self.logger.error(f"时区处理出错: {e},使用系统时间")
-            return datetime.datetime.now()
+            self.logger.error("时区处理出错: %s,使用系统时间", e)
+        return None
+
+    def _get_timezone_now(self):
+        """
+        获取配置时区的当前时间
+        
+        使用初始化时解析并缓存的时区对象，避免每次调用重复导入与查找。
+        时区不可用时回退到系统时间。
+        
+        Returns:
+            datetime.datetime: 当前时间对象
+        
+        Note:
+            默认时区为Asia/Shanghai
+        """
+        if self._tz is not None:
+            return datetime.datetime.now(self._tz)
+        return datetime.datetime.now()
 
     async def start(self):
         """
@@ -198,14 +361,14 @@ class DiaryScheduler:
         检查插件配置，根据过滤模式和目标聊天列表决定是否启动定时任务。
         如果配置为白名单模式且目标列表为空，则不启动定时任务。
         
-        启动成功后会创建异步任务循环，等待配置的时间点执行日记生成。
+        启动成功后会在事件循环上注册一次性定时器，到达配置的时间点执行日记生成。
         """
         if self.is_running:
             return
         
         # 检查配置是否应该启动定时任务
-        target_chats = self.plugin.get_config("schedule.target_chats", [])
-        filter_mode = self.plugin.get_config("schedule.filter_mode", "whitelist")
+        target_chats = self._c("target_chats", [])
+        filter_mode = self._c("filter_mode", "whitelist")
         
         chat_resolver = ChatIdResolver()
         strategy, _ = chat_resolver.resolve_target_chats(filter_mode, target_chats)
@@ -215,21 +378,26 @@ class DiaryScheduler:
             return
         
         self.is_running = True
-        self.task = asyncio.create_task(self._schedule_loop())
-        schedule_time = self.plugin.get_config("schedule.schedule_time", "23:30")
-        self.logger.info(f"定时任务已启动 - 模式: {filter_mode}, 执行时间: {schedule_time}")
+        self._loop = asyncio.get_running_loop()
+        self._schedule_next()
+        self.logger.info("定时任务已启动 - 模式: %s, 执行时间: %02d:%02d",
+                         filter_mode, self._target_time.hour, self._target_time.minute)
 
     async def stop(self):
         """
         停止定时任务
         
-        取消正在运行的定时任务，并等待任务完全结束。
+        取消尚未触发的定时器和正在运行的生成任务（含其中挂起的LLM请求与发布），
+        并等待任务完全结束。
         确保资源正确释放，避免任务泄漏。
         """
         if not self.is_running:
             return
         
         self.is_running = False
+        if self._timer_handle:
+            self._timer_handle.cancel()
+            self._timer_handle = None
         if self.task:
             self.task.cancel()
             try:
@@ -238,76 +406,116 @@ class DiaryScheduler:
                 pass
         self.logger.info("日记定时任务已停止")
 
-    async def _schedule_loop(self):
+    def _schedule_next(self):
         """
-        定时任务循环
+        计算下次执行时间并注册定时器
         
-        持续运行的异步循环，计算下次执行时间并等待。
-        当到达配置的时间点时，自动执行日记生成任务。
+        使用事件循环的 call_later（基于单调时钟）挂起到目标时间点，
+        等待期间不占用任何协程。计算失败时60秒后重试。
+        每次调度前先比对执行时间与时区配置，编辑配置后下一次运行即按新值计算。
+        """
+        try:
+            self._refresh_schedule_config()
+            now = self._get_timezone_now()
+            run_date = now.date()
+            if now.time() >= self._target_time:
+                run_date += datetime.timedelta(days=1)
+            
+            if hasattr(self._tz, "localize"):
+                # pytz时区需要通过localize附加，直接传tzinfo会得到LMT偏移
+                next_run = self._tz.localize(datetime.datetime.combine(run_date, self._target_time))
+            else:
+                next_run = datetime.datetime.combine(run_date, self._target_time, tzinfo=self._tz)
+            
+            # 用时间戳相减，跨夏令时切换时也能得到真实的等待秒数
+            wait_seconds = next_run.timestamp() - now.timestamp()
+            self.logger.info("下次日记生成时间: %s", next_run)
+        except Exception as e:
+            self.logger.error("定时任务出错: %s", e)
+            wait_seconds = 60
         
-        循环会处理异常情况，确保单次失败不会影响后续执行。
+        loop = self._loop or asyncio.get_running_loop()
+        self._timer_handle = loop.call_later(wait_seconds, self._on_timer)
+
+    def _on_timer(self):
+        """定时器回调：在事件循环中派发日记生成任务"""
+        self._timer_handle = None
+        if not self.is_running:
+            return
+        if self.task is not None and not self.task.done():
+            # 上一次生成仍在进行，不并发启动第二个任务；其结束时会重新调度
+            self.logger.warning("上一次定时日记生成尚未结束,跳过本次触发")
+            return
+        self.task = asyncio.create_task(self._fire_and_reschedule())
+
+    async def _fire_and_reschedule(self):
         """
-        while self.is_running:
-            try:
-                now = self._get_timezone_now()
-                schedule_time_str = self.plugin.get_config("schedule.schedule_time", "23:30")
-                
-                schedule_hour, schedule_minute = map(int, schedule_time_str.split(":"))
-                today_schedule = now.replace(hour=schedule_hour, minute=schedule_minute, second=0, microsecond=0)
-                
-                if now >= today_schedule:
-                    today_schedule += datetime.timedelta(days=1)
-                
-                wait_seconds = (today_schedule - now).total_seconds()
-                self.logger.info(f"下次日记生成时间: {today_schedule.strftime('%Y-%m-%d %H:%M:%S')}")
-                
-                await asyncio.sleep(wait_seconds)
-                if self.is_running:
-                    await self._generate_daily_diary()
-                
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                self.logger.error(f"定时任务出错: {e}")
-                await asyncio.sleep(60)
+        执行一次日记生成并注册下一次定时器
+        
+        单次失败不会影响后续执行；停止后不再重新调度。
+        """
+        try:
+            await self._generate_daily_diary()
+        finally:
+            if self.is_running:
+                self._schedule_next()
+
+    def _get_diary_action(self) -> DiaryGeneratorAction:
+        """
+        获取定时任务使用的日记生成Action
+        
+        首次调用时创建并缓存，之后每次运行复用同一实例，
+        避免重复初始化存储、QQ空间API和日记服务。日期通过参数逐次传入。
+        
+        Returns:
+            DiaryGeneratorAction: 日记生成Action实例
+        """
+        if self._diary_action is None:
+            self._diary_action = DiaryGeneratorAction(
+                action_data={"date": "", "target_chats": [], "is_manual": False},
+                action_reasoning=SCHEDULED_REASONING,
+                cycle_timers={},
+                thinking_id=SCHEDULED_THINKING_ID,
+                chat_stream=MOCK_CHAT_STREAM,
+                log_prefix=SCHEDULED_LOG_PREFIX,
+                plugin_config=self.plugin.config,  # 传递完整配置
+                action_message=None
+            )
+        return self._diary_action
 
     async def _generate_daily_diary(self):
         """
         生成每日日记
         
-        定时任务的核心执行方法，创建日记生成Action并执行。
+        定时任务的核心执行方法，获取复用的日记生成Action并执行。
         完全静默运行，不发送任何消息到聊天，只记录日志。
         
         生成成功后会自动尝试发布到QQ空间，并记录执行结果。
         
         Note:
-            使用MockChatStream作为虚拟聊天流，避免定时任务中的消息发送
+            使用共享的MOCK_CHAT_STREAM作为虚拟聊天流，避免定时任务中的消息发送
         """
         try:
-            today = datetime.datetime.now().strftime("%Y-%m-%d")
-            
-            diary_action = DiaryGeneratorAction(
-                action_data={"date": today, "target_chats": [], "is_manual": False},
-                action_reasoning="定时生成日记",
-                cycle_timers={},
-                thinking_id="scheduled_diary",
-                chat_stream=MockChatStream(),
-                log_prefix="[ScheduledDiary]",
-                plugin_config=self.plugin.config,  # 传递完整配置
-                action_message=None
-            )
+            # get_daily_messages按系统本地时间计算当天的消息时间窗，日期也必须取本地日期；
+            # 若按配置时区取日期，配置时区快于本地时区时零点后执行会查询本地的"明天"而取不到消息
+            today = datetime.date.today().isoformat()
+            diary_action = self._get_diary_action()
+            diary_action.action_data["date"] = today
             
             success, result = await diary_action.generate_diary(today)
             
             if success:
                 qzone_success = await diary_action._publish_to_qzone(result, today)
                 if qzone_success:
-                    self.logger.info(f"定时日记生成成功: {today} ({len(result)}字) - QQ空间发布成功")
+                    self.logger.info("定时日记生成成功: %s (%d字) - QQ空间发布成功", today, len(result))
                 else:
-                    self.logger.info(f"定时日记生成成功: {today} ({len(result)}字) - QQ空间发布失败")
+                    self.logger.info("定时日记生成成功: %s (%d字) - QQ空间发布失败", today, len(result))
                     
             else:
-                self.logger.error(f"定时日记生成失败: {today} - {result}")
+                self.logger.error("定时日记生成失败: %s - %s", today, result)
                 
+        except asyncio.CancelledError:
+            self.logger.info("定时日记生成已取消")
+            raise
         except Exception as e:
-            self.logger.error(f"定时生成日记出错: {e}")
\ No newline at end of file
+            self.logger.error("定时生成日记出错: %s", e)
\ No newline at end of file
@@ -20,14 +20,17 @@
 """
 
 import asyncio
-import datetime
+import bisect
 import time
-import json
 import os
 import re
+import threading
+import atexit
 import hashlib
+import functools
 import httpx
-from typing import List, Tuple, Type, Dict, Any, Optional
+from collections import OrderedDict
+from typing import List, Tuple, Type, Dict, Any, Optional, Iterator
 
 from src.plugin_system.apis import (
     config_api,
@@ -36,10 +39,23 @@ from src.plugin_system.apis import (
 )
 
 # 导入共享的工具类
-from .utils import ChatIdResolver, format_date_str
+from .utils import ChatIdResolver, format_date_str, read_json_file, write_json_file
 
 logger = get_logger("diary_plugin.storage")
 
+# 日记文件后缀，文件名格式为 YYYY-MM-DD_HHMMSS.json
+DIARY_FILE_SUFFIX = ".json"
+
+
+@functools.lru_cache(maxsize=8)
+def _compute_gtk(skey: str) -> str:
+    """按skey缓存的gtk计算（算法见DiaryQzoneAPI._generate_gtk）"""
+    # 每步截断到32位：结果只取低31位，截断不影响结果，且避免大整数随长度增长
+    hash_val = 5381
+    for code in map(ord, skey):
+        hash_val = (hash_val * 33 + code) & 0xFFFFFFFF
+    return str(hash_val & 2147483647)
+
 
 class DiaryQzoneAPI:
     """
@@ -67,11 +83,19 @@ class DiaryQzoneAPI:
     - 需要正确配置Bot的QQ账号
     - 需要Napcat服务正常运行
     - Cookie会自动缓存到本地文件
+    - 从Napcat获取的Cookie在内存中缓存COOKIE_TTL秒
     """
     
+    # 从Napcat获取的cookies在内存中的有效期（秒）
+    COOKIE_TTL = 600
+    # 所有实例共享的HTTP客户端（连接池），Napcat与QQ空间请求均复用其中的keep-alive连接
+    _shared_client: Optional[httpx.AsyncClient] = None
+    PUBLISH_URL = "https://user.qzone.qq.com/proxy/domain/taotao.qzone.qq.com/cgi-bin/emotion_cgi_publish_v6"
+    
     def __init__(self):
         self.cookies = {}
         self.gtk2 = ''
+        self._cookies_loaded_at = 0.0  # 最近一次从Napcat获取cookies的时间
         
         # 安全的uin获取
         try:
@@ -88,11 +112,48 @@ class DiaryQzoneAPI:
         # 使用更安全的文件名
         safe_uin = max(self.uin, 0)  # 确保非负数
         self.cookie_file = os.path.join(os.path.dirname(__file__), "..", "data", f"qzone_cookies_{safe_uin}.json")
+        
+        # 发布请求中与内容无关的部分，每个实例只构造一次
+        self._qzone_referer = f"https://user.qzone.qq.com/{self.uin}"
+        self._publish_headers = {
+            'referer': self._qzone_referer,
+            'origin': 'https://user.qzone.qq.com',
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        }
+        self._base_post_data = {
+            "syn_tweet_verson": "1",
+            "paramstr": "1",
+            "who": "1",
+            "feedversion": "1",
+            "ver": "1",
+            "ugc_right": "1",
+            "to_sign": "0",
+            "hostuin": self.uin,
+            "code_version": "1",
+            "format": "json",
+            "qzreferrer": self._qzone_referer
+        }
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """获取共享的HTTP客户端，首次使用或已关闭时惰性创建"""
+        client = DiaryQzoneAPI._shared_client
+        if client is None or client.is_closed:
+            client = DiaryQzoneAPI._shared_client = httpx.AsyncClient(
+                timeout=30.0,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+            )
+        return client
+    
+    @classmethod
+    async def aclose(cls):
+        """关闭共享的HTTP客户端，插件卸载时调用；之后再次请求会重新创建"""
+        client = DiaryQzoneAPI._shared_client
+        DiaryQzoneAPI._shared_client = None
+        if client is not None and not client.is_closed:
+            await client.aclose()
     
     async def _fetch_cookies_by_napcat(self, host: str, port: str, napcat_token: str = "") -> dict:
         """通过Napcat自动获取cookies"""
-        import httpx
-        
         url = f"http://{host}:{port}/get_cookies"
         domain = "user.qzone.qq.com"
         
@@ -103,34 +164,32 @@ class DiaryQzoneAPI:
             
             payload = {"domain": domain}
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                resp = await client.post(url, json=payload, headers=headers)
-                resp.raise_for_status()
-                
-                if resp.status_code != 200:
-                    raise RuntimeError(f"Napcat服务返回错误状态码: {resp.status_code}")
-                
-                data = resp.json()
-                if data.get("status") != "ok" or "cookies" not in data.get("data", {}):
-                    raise RuntimeError(f"获取cookie失败: {data}")
-                
-                cookie_str = data["data"]["cookies"]
-                
-                # 安全的cookie解析
-                cookies = {}
-                try:
-                    for pair in cookie_str.split("; "):
-                        if "=" in pair:
-                            key, value = pair.split("=", 1)
-                            cookies[key] = value
-                        else:
-                            logger.warning(f"跳过格式错误的cookie: {pair}")
-                except Exception as parse_error:
-                    logger.error(f"Cookie解析失败: {parse_error}")
-                    raise RuntimeError(f"Cookie格式错误: {cookie_str}")
-                
-                return cookies
-                
+            client = self._get_client()
+            resp = await client.post(url, json=payload, headers=headers)
+            resp.raise_for_status()
+            
+            if resp.status_code != 200:
+                raise RuntimeError(f"Napcat服务返回错误状态码: {resp.status_code}")
+            
+            data = resp.json()
+            if data.get("status") != "ok" or "cookies" not in data.get("data", {}):
+                raise RuntimeError(f"获取cookie失败: {data}")
+            
+            cookie_str = data["data"]["cookies"]
+            
+            if not isinstance(cookie_str, str):
+                raise RuntimeError(f"Cookie格式错误: {cookie_str}")
+            
+            # 按 "; " 切分后用partition拆出键值（每个片段只扫描一次），缺少"="的片段跳过
+            parts = [pair.partition("=") for pair in cookie_str.split("; ")]
+            cookies = {key: value for key, sep, value in parts if sep}
+            if len(cookies) < len(parts):
+                skipped = sum(1 for key, sep, _ in parts if key and not sep)
+                if skipped:
+                    logger.warning(f"跳过{skipped}个格式错误的cookie片段")
+            
+            return cookies
+            
         except Exception as e:
             logger.error(f"通过Napcat获取cookies失败: {e}")
             raise
@@ -140,18 +199,13 @@ class DiaryQzoneAPI:
         try:
             cookie_dict = await self._fetch_cookies_by_napcat(host, port, napcat_token)
             
-            cookie_dir = os.path.dirname(self.cookie_file)
-            os.makedirs(cookie_dir, exist_ok=True)
-            
-            if not os.access(cookie_dir, os.W_OK):
-                raise PermissionError(f"无法写入目录: {cookie_dir}")
-            
-            with open(self.cookie_file, "w", encoding="utf-8") as f:
-                json.dump(cookie_dict, f, indent=4, ensure_ascii=False)
+            # 文件写入在工作线程中执行，不阻塞事件循环
+            await asyncio.to_thread(self._save_cookie_file, cookie_dict)
             
             self.cookies = cookie_dict
             if 'p_skey' in self.cookies:
                 self.gtk2 = self._generate_gtk(self.cookies['p_skey'])
+            self._cookies_loaded_at = time.time()
             
             return True
             
@@ -159,10 +213,9 @@ class DiaryQzoneAPI:
             logger.error(f"自动更新cookies失败: {e}")
             try:
                 if os.path.exists(self.cookie_file):
-                    with open(self.cookie_file, 'r', encoding='utf-8') as f:
-                        self.cookies = json.load(f)
-                        if 'p_skey' in self.cookies:
-                            self.gtk2 = self._generate_gtk(self.cookies['p_skey'])
+                    self.cookies = await asyncio.to_thread(read_json_file, self.cookie_file)
+                    if 'p_skey' in self.cookies:
+                        self.gtk2 = self._generate_gtk(self.cookies['p_skey'])
                     logger.debug("使用本地cookies文件")
                     return True
                 else:
@@ -172,6 +225,16 @@ class DiaryQzoneAPI:
                 logger.error(f"加载本地cookies失败: {load_error}")
                 return False
     
+    def _save_cookie_file(self, cookie_dict: Dict[str, str]):
+        """把cookies写入本地缓存文件（阻塞调用，需在工作线程中执行）"""
+        cookie_dir = os.path.dirname(self.cookie_file)
+        os.makedirs(cookie_dir, exist_ok=True)
+        
+        if not os.access(cookie_dir, os.W_OK):
+            raise PermissionError(f"无法写入目录: {cookie_dir}")
+        
+        write_json_file(self.cookie_file, cookie_dict)
+    
     def _generate_gtk(self, skey: str) -> str:
         """
         生成QQ空间API调用所需的gtk值。
@@ -187,70 +250,77 @@ class DiaryQzoneAPI:
             
         Note:
             算法细节：初始化hash_val为5381，对skey每个字符执行
-            hash_val += (hash_val << 5) + ord(skey[i])，最后与2147483647进行与运算
+            hash_val += (hash_val << 5) + ord(skey[i])，最后与2147483647进行与运算。
+            同一cookie周期内p_skey不变，结果按skey缓存。
+        """
+        return _compute_gtk(skey)
+    
+    async def _ensure_cookies(self, host: str, port: str, napcat_token: str, force: bool = False) -> bool:
         """
-        hash_val = 5381
-        for i in range(len(skey)):
-            hash_val += (hash_val << 5) + ord(skey[i])
-        return str(hash_val & 2147483647)
+        确保持有可用的cookies
+        
+        内存中的cookies在有效期内直接复用，不再请求Napcat；
+        过期或force=True时重新获取。
+        """
+        if (not force and self.cookies and self.gtk2
+                and time.time() - self._cookies_loaded_at < self.COOKIE_TTL):
+            return True
+        return await self._renew_cookies(host, port, napcat_token)
+    
+    async def _post_publish(self, content: str) -> bool:
+        """向QQ空间发送一次发布请求，返回是否发布成功"""
+        post_data = {**self._base_post_data, "con": content}
+        
+        client = self._get_client()
+        response = await client.post(
+            self.PUBLISH_URL,
+            params={
+                'g_tk': self.gtk2,
+                'uin': self.uin,
+            },
+            data=post_data,
+            headers=self._publish_headers,
+            cookies=self.cookies
+        )
+        
+        if response.status_code == 200:
+            result = response.json()
+            if 'tid' in result:
+                return True
+            logger.error(f"QQ空间发布失败: {result}")
+            return False
+        logger.error(f"QQ空间API请求失败: {response.status_code}")
+        return False
     
     async def publish_diary(self, content: str, napcat_host: str = "127.0.0.1", napcat_port: str = "9998", napcat_token: str = "") -> bool:
-        """发布日记到QQ空间"""
+        """
+        发布日记到QQ空间
+        
+        优先使用有效期内的缓存cookies；使用缓存cookies发布失败时
+        （可能是cookies已失效）强制刷新cookies并重试一次。
+        """
         try:
-            import httpx
-            
-            cookie_success = await self._renew_cookies(napcat_host, napcat_port, napcat_token)
-            if not cookie_success:
-                logger.error("无法获取QQ空间cookies")
-                return False
-            
-            if not self.cookies or not self.gtk2:
-                logger.error("QQ空间cookies无效")
-                return False
-            
-            publish_url = "https://user.qzone.qq.com/proxy/domain/taotao.qzone.qq.com/cgi-bin/emotion_cgi_publish_v6"
-            
-            post_data = {
-                "syn_tweet_verson": "1",
-                "paramstr": "1",
-                "who": "1",
-                "con": content,
-                "feedversion": "1",
-                "ver": "1",
-                "ugc_right": "1",
-                "to_sign": "0",
-                "hostuin": self.uin,
-                "code_version": "1",
-                "format": "json",
-                "qzreferrer": f"https://user.qzone.qq.com/{self.uin}"
-            }
-            
-            async with httpx.AsyncClient(timeout=30) as client:
-                response = await client.post(
-                    publish_url,
-                    params={
-                        'g_tk': self.gtk2,
-                        'uin': self.uin,
-                    },
-                    data=post_data,
-                    headers={
-                        'referer': f'https://user.qzone.qq.com/{self.uin}',
-                        'origin': 'https://user.qzone.qq.com',
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                    }, cookies=self.cookies
-                )
+            for attempt in range(2):
+                used_cache = (attempt == 0 and bool(self.cookies) and bool(self.gtk2)
+                              and time.time() - self._cookies_loaded_at < self.COOKIE_TTL)
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    if 'tid' in result:
-                        return True
-                    else:
-                        logger.error(f"QQ空间发布失败: {result}")
-                        return False
-                else:
-                    logger.error(f"QQ空间API请求失败: {response.status_code}")
+                cookie_success = await self._ensure_cookies(napcat_host, napcat_port, napcat_token, force=attempt > 0)
+                if not cookie_success:
+                    logger.error("无法获取QQ空间cookies")
                     return False
-                    
+                
+                if not self.cookies or not self.gtk2:
+                    logger.error("QQ空间cookies无效")
+                    return False
+                
+                if await self._post_publish(content):
+                    return True
+                if not used_cache:
+                    return False
+                logger.info("使用缓存cookies发布失败,刷新cookies后重试")
+                self._cookies_loaded_at = 0.0
+            return False
+                
         except Exception as e:
             logger.error(f"发布QQ空间失败: {e}")
             return False
@@ -298,8 +368,47 @@ class DiaryStorage:
     - 自动创建必要的目录结构
     - 处理文件权限和IO异常
     - 支持同一天多次生成的版本管理
+    - 已解析的日记按 (路径, mtime, 大小) 做LRU缓存，各实例共享
+    - 按日期维护文件名索引，查询时不再逐次列目录
+    - index.json 按文件名记录日期、生成时间、字数和发布状态，
+      查询最新日记时先在索引中排序，只打开实际返回的文件
     """
     
+    # 已解析日记的LRU缓存：路径 -> ((st_mtime_ns, st_size), 日记数据)
+    # 插件、命令、Action等各自创建实例，缓存放在类级别以便共享
+    _CACHE_MAX_ENTRIES = 1024
+    _parsed_cache: "OrderedDict[str, Tuple[Tuple[int, int], Dict[str, Any]]]" = OrderedDict()
+    _cache_lock = threading.Lock()
+    
+    # 内存中的索引（index.json的权威副本），保存时增量更新计数；
+    # _index_dir_mtime 为索引对应的日记目录mtime，与_list_filenames相同，据此发现外部增删文件
+    _index_cache: Optional[Dict[str, Any]] = None
+    _index_dir_mtime: Optional[int] = -1
+    _write_lock = threading.Lock()
+    
+    # index.json 延迟落盘：累计_INDEX_FLUSH_EVERY次保存或距上次落盘超过_INDEX_FLUSH_INTERVAL秒时写入
+    _INDEX_FLUSH_EVERY = 16
+    _INDEX_FLUSH_INTERVAL = 30.0
+    _index_dirty_saves = 0
+    _last_index_flush = 0.0
+    _atexit_registered = False
+    
+    # 后台写入队列：突发保存时合并为一批写入，整批只更新一次索引
+    _WRITE_BATCH_MAX = 64
+    
+    # list_diaries 分块并行解析时每块的文件数
+    _PARSE_CHUNK_SIZE = 32
+    _write_queue: Optional[asyncio.Queue] = None
+    _writer_task: Optional[asyncio.Task] = None
+    
+    # 文件名索引：日期 -> 该日期的日记文件名（有序），以目录mtime校验是否被外部修改
+    _filename_index: Optional[Dict[str, List[str]]] = None
+    _filename_index_mtime: int = -1
+    _names_lock = threading.Lock()
+    
+    # 启动时清理上次异常退出遗留的 .tmp 临时文件（每个进程只做一次）
+    _tmp_cleaned = False
+    
     def __init__(self):
         base_dir = os.path.dirname(__file__)
         self.data_dir = os.path.join(base_dir, "..", "data", "diaries")
@@ -312,6 +421,204 @@ class DiaryStorage:
             logger.warning(f"日记数据目录无写入权限: {self.data_dir}")
         if not os.access(os.path.dirname(self.index_file), os.W_OK):
             logger.warning(f"索引文件目录无写入权限: {os.path.dirname(self.index_file)}")
+        
+        if not DiaryStorage._tmp_cleaned:
+            DiaryStorage._tmp_cleaned = True
+            self._remove_stale_tmp_files()
+        
+        if not DiaryStorage._atexit_registered:
+            # 进程退出时把未写入的日记和延迟的索引修改写盘
+            DiaryStorage._atexit_registered = True
+            atexit.register(self._flush_on_exit)
+    
+    def _remove_stale_tmp_files(self):
+        """删除原子写入中断后遗留的 .tmp 文件"""
+        for directory in (self.data_dir, os.path.dirname(self.index_file)):
+            try:
+                with os.scandir(directory) as it:
+                    stale = [entry.path for entry in it if entry.name.endswith('.tmp') and entry.is_file()]
+            except OSError:
+                continue
+            for path in stale:
+                try:
+                    os.remove(path)
+                    logger.info(f"已清理残留临时文件: {path}")
+                except OSError as e:
+                    logger.warning(f"清理临时文件失败: {path} ({e})")
+    
+    @staticmethod
+    def _read_json(file_path: str) -> Any:
+        """读取并解析JSON文件（阻塞调用，需在工作线程中执行）"""
+        return read_json_file(file_path)
+    
+    @staticmethod
+    def _write_json(file_path: str, data: Any):
+        """序列化并写入JSON文件（阻塞调用，需在工作线程中执行）"""
+        write_json_file(file_path, data)
+    
+    def _load_cached(self, file_path: str, st: Optional[os.stat_result] = None) -> Dict[str, Any]:
+        """
+        读取日记文件，文件未变化时直接返回缓存的解析结果（阻塞调用）
+        
+        以 (st_mtime_ns, st_size) 判断文件是否变化；返回浅拷贝，
+        调用方修改返回值不会污染缓存。
+        
+        Args:
+            file_path: 日记文件路径
+            st: 调用方已取得的stat结果（如DirEntry.stat()），省去一次stat
+        """
+        if st is None:
+            st = os.stat(file_path)
+        key = (st.st_mtime_ns, st.st_size)
+        with self._cache_lock:
+            entry = self._parsed_cache.get(file_path)
+            if entry is not None and entry[0] == key:
+                self._parsed_cache.move_to_end(file_path)
+                return dict(entry[1])
+        
+        data = self._read_json(file_path)
+        with self._cache_lock:
+            self._parsed_cache[file_path] = (key, data)
+            self._parsed_cache.move_to_end(file_path)
+            while len(self._parsed_cache) > self._CACHE_MAX_ENTRIES:
+                self._parsed_cache.popitem(last=False)
+        return dict(data)
+    
+    def _invalidate_cached(self, file_path: str):
+        """丢弃指定文件的缓存条目"""
+        with self._cache_lock:
+            self._parsed_cache.pop(file_path, None)
+    
+    def _iter_diary_files(self, date: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        逐个读取日记目录中的日记文件（阻塞调用，需在工作线程中执行）
+        
+        Args:
+            date: 指定日期时只读取该日期的文件，否则读取全部
+        """
+        yield from self._iter_filenames(self._list_filenames(date))
+    
+    def _iter_filenames(self, filenames: List[str]) -> Iterator[Dict[str, Any]]:
+        """逐个读取给定文件名的日记，跳过已删除或无法解析的文件（阻塞调用）"""
+        for filename in filenames:
+            try:
+                yield self._load_cached(os.path.join(self.data_dir, filename))
+            except FileNotFoundError:
+                continue  # 文件已被外部删除，下次读取时索引会随目录mtime重建
+            except Exception as e:
+                logger.warning(f"跳过无法解析的日记文件 {filename}: {e}")
+    
+    def _load_filenames(self, filenames: List[str]) -> List[Dict[str, Any]]:
+        """读取一批日记文件（阻塞调用，供分块并行解析使用）"""
+        return list(self._iter_filenames(filenames))
+    
+    def _load_diary_files(self, date: Optional[str] = None) -> List[Dict[str, Any]]:
+        """读取日记目录中的日记文件列表（阻塞调用，需在工作线程中执行）"""
+        return list(self._iter_diary_files(date))
+    
+    def _load_latest_diary(self, date: str) -> Optional[Dict[str, Any]]:
+        """返回指定日期generation_time最大的一篇日记，只打开该文件（阻塞调用）"""
+        latest = self._load_first(self._rank_filenames(self._list_filenames(date)), 1)
+        return latest[0] if latest else None
+    
+    def _rank_filenames(self, filenames: List[str]) -> List[str]:
+        """
+        按索引条目中的generation_time从新到旧排列文件名（阻塞调用）
+        
+        索引中没有记录的文件（如外部新增）读取文件本身获取生成时间，
+        已删除或无法解析的文件被排除；生成时间相同时保持原有顺序。
+        """
+        times: Dict[str, Any] = {}
+        missing = []
+        with self._write_lock:
+            entries = self._ensure_index()["entries"]
+            for filename in filenames:
+                meta = entries.get(filename)
+                if meta is None:
+                    missing.append(filename)
+                else:
+                    times[filename] = meta["generation_time"]
+        
+        for filename in missing:
+            try:
+                diary = self._load_cached(os.path.join(self.data_dir, filename))
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                logger.warning(f"跳过无法解析的日记文件 {filename}: {e}")
+                continue
+            times[filename] = diary.get('generation_time', 0)
+        
+        return sorted((name for name in filenames if name in times), key=times.__getitem__, reverse=True)
+    
+    def _load_first(self, filenames: List[str], limit: int) -> List[Dict[str, Any]]:
+        """按顺序读取日记，凑满limit篇可解析的日记即停止（阻塞调用）"""
+        diaries = []
+        for diary in self._iter_filenames(filenames):
+            diaries.append(diary)
+            if len(diaries) >= limit:
+                break
+        return diaries
+    
+    @staticmethod
+    def _filename_date_key(filename: str) -> str:
+        """文件名 YYYY-MM-DD_HHMMSS.json 的日期部分"""
+        return filename.partition('_')[0]
+    
+    def _list_filenames(self, date: Optional[str] = None) -> List[str]:
+        """
+        从文件名索引获取日记文件名（阻塞调用，需在工作线程中执行）
+        
+        索引在首次使用或日记目录mtime变化（外部增删文件）时重建一次，
+        之后按日期直接查表，不再逐次列目录。
+        
+        Args:
+            date: 指定日期时只返回该日期的文件名，否则返回全部
+        """
+        try:
+            dir_mtime = os.stat(self.data_dir).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        wanted = format_date_str(date) if date else None
+        
+        with self._names_lock:
+            if DiaryStorage._filename_index is None or dir_mtime != DiaryStorage._filename_index_mtime:
+                index: Dict[str, List[str]] = {}
+                setdefault = index.setdefault
+                date_key = self._filename_date_key
+                with os.scandir(self.data_dir) as it:
+                    for entry in it:
+                        name = entry.name
+                        if name.endswith(DIARY_FILE_SUFFIX) and entry.is_file():
+                            setdefault(date_key(name), []).append(name)
+                for names in index.values():
+                    names.sort()
+                DiaryStorage._filename_index = index
+                DiaryStorage._filename_index_mtime = dir_mtime
+            
+            if wanted is not None:
+                return list(DiaryStorage._filename_index.get(wanted, ()))
+            return [name for names in DiaryStorage._filename_index.values() for name in names]
+    
+    def _record_filenames(self, filenames: List[str], dir_mtime_before: Optional[int]):
+        """
+        把本进程新写入的文件登记到文件名索引
+        
+        仅当写入前索引与目录一致时才增量登记并更新mtime；
+        否则说明目录已被外部修改，保持失效状态等待下次读取时重建。
+        """
+        with self._names_lock:
+            if DiaryStorage._filename_index is None or dir_mtime_before != DiaryStorage._filename_index_mtime:
+                return
+            for filename in filenames:
+                names = DiaryStorage._filename_index.setdefault(self._filename_date_key(filename), [])
+                pos = bisect.bisect_left(names, filename)
+                if pos == len(names) or names[pos] != filename:
+                    names.insert(pos, filename)
+            try:
+                DiaryStorage._filename_index_mtime = os.stat(self.data_dir).st_mtime_ns
+            except OSError:
+                DiaryStorage._filename_index = None
     
     async def save_diary(self, diary_data: Dict[str, Any], expected_hour: int = None, expected_minute: int = None) -> bool:
         """保存日记到JSON文件"""
@@ -322,15 +629,15 @@ class DiaryStorage:
             if expected_hour is not None and expected_minute is not None:
                 filename = f"{format_date_str(date)}_{expected_hour:02d}{expected_minute:02d}00.json"
             else:
-                timestamp = datetime.datetime.fromtimestamp(generation_time)
-                filename = f"{format_date_str(date)}_{timestamp.strftime('%H%M%S')}.json"
+                lt = time.localtime(generation_time)
+                filename = f"{format_date_str(date)}_{lt.tm_hour:02d}{lt.tm_min:02d}{lt.tm_sec:02d}.json"
             
             file_path = os.path.join(self.data_dir, filename)
             
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(diary_data, f, ensure_ascii=False, indent=2)
-            
-            await self._update_index(diary_data)
+            # 交给后台写入任务批量落盘，等待本条写入完成后再返回
+            future = asyncio.get_running_loop().create_future()
+            await self._ensure_writer().put((file_path, diary_data, future))
+            await future
             
             return True
         except Exception as e:
@@ -342,22 +649,7 @@ class DiaryStorage:
     async def get_diary(self, date: str) -> Optional[Dict[str, Any]]:
         """获取指定日期的最新日记"""
         try:
-            if not os.path.exists(self.data_dir):
-                return None
-            
-            date_files = []
-            for filename in os.listdir(self.data_dir):
-                if filename.startswith(f"{format_date_str(date)}_") and filename.endswith('.json'):
-                    file_path = os.path.join(self.data_dir, filename)
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        diary_data = json.load(f)
-                        date_files.append(diary_data)
-            
-            if date_files:
-                latest_diary = max(date_files, key=lambda x: x.get('generation_time', 0))
-                return latest_diary
-            
-            return None
+            return await asyncio.to_thread(self._load_latest_diary, date)
         except Exception as e:
             logger.error(f"读取日记失败: {e}")
             return None
@@ -365,16 +657,7 @@ class DiaryStorage:
     async def get_diaries_by_date(self, date: str) -> List[Dict[str, Any]]:
         """获取指定日期的所有日记"""
         try:
-            if not os.path.exists(self.data_dir):
-                return []
-            
-            date_files = []
-            for filename in os.listdir(self.data_dir):
-                if filename.startswith(f"{format_date_str(date)}_") and filename.endswith('.json'):
-                    file_path = os.path.join(self.data_dir, filename)
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        diary_data = json.load(f)
-                        date_files.append(diary_data)
+            date_files = await asyncio.to_thread(self._load_diary_files, date)
             
             # 按生成时间排序
             date_files.sort(key=lambda x: x.get('generation_time', 0))
@@ -386,20 +669,15 @@ class DiaryStorage:
     async def list_diaries(self, limit: int = 10) -> List[Dict[str, Any]]:
         """列出最近的日记"""
         try:
-            diary_files = []
-            
-            if not os.path.exists(self.data_dir):
-                return []
-            
-            for filename in os.listdir(self.data_dir):
-                if filename.endswith('.json'):
-                    file_path = os.path.join(self.data_dir, filename)
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        diary_data = json.load(f)
-                        diary_files.append(diary_data)
+            # 先按索引中的生成时间排序，只打开需要返回的文件
+            filenames = await asyncio.to_thread(lambda: self._rank_filenames(self._list_filenames()))
+            if limit > 0:
+                return await asyncio.to_thread(self._load_first, filenames, limit)
             
-            diary_files.sort(key=lambda x: x.get('generation_time', 0), reverse=True)
-            return diary_files[:limit] if limit > 0 else diary_files
+            # 需要全部日记时分块并行解析，每块一次线程调度
+            chunks = [filenames[i:i + self._PARSE_CHUNK_SIZE] for i in range(0, len(filenames), self._PARSE_CHUNK_SIZE)]
+            parsed = await asyncio.gather(*(asyncio.to_thread(self._load_filenames, chunk) for chunk in chunks))
+            return [diary for chunk in parsed for diary in chunk]
         except Exception as e:
             logger.error(f"列出日记失败: {e}")
             return []
@@ -407,14 +685,16 @@ class DiaryStorage:
     async def get_stats(self) -> Dict[str, Any]:
         """获取日记统计信息"""
         try:
-            diaries = await self.list_diaries(limit=0)
-            if not diaries:
+            # 直接读取索引中增量维护的统计，不再加载全部日记
+            index_data = await asyncio.to_thread(self._index_snapshot)
+            # 无法解析的文件不会出现在日记列表中，统计同样排除
+            total_count = index_data["total_diaries"] - index_data["unreadable_count"]
+            if total_count <= 0:
                 return {"total_count": 0, "total_words": 0, "avg_words": 0, "latest_date": "无"}
             
-            total_count = len(diaries)
-            total_words = sum(diary.get("word_count", 0) for diary in diaries)
-            avg_words = total_words // total_count if total_count > 0 else 0
-            latest_date = max(diaries, key=lambda x: x.get('generation_time', 0)).get('date', '无')
+            total_words = index_data["total_words"]
+            avg_words = total_words // total_count
+            latest_date = index_data["latest_date"] or '无'
             
             return {
                 "total_count": total_count,
@@ -426,38 +706,364 @@ class DiaryStorage:
             logger.error(f"获取统计信息失败: {e}")
             return {"total_count": 0, "total_words": 0, "avg_words": 0, "latest_date": "无"}
     
-    async def _update_index(self, diary_data: Dict[str, Any]):
-        """更新索引文件"""
+    def _ensure_writer(self) -> asyncio.Queue:
+        """获取写入队列，后台写入任务未运行（或属于其他事件循环）时惰性启动"""
+        loop = asyncio.get_running_loop()
+        task = DiaryStorage._writer_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            old_queue = DiaryStorage._write_queue
+            if old_queue is not None and not old_queue.empty():
+                # 旧队列不会再被消费：先把其中剩余的请求写入，避免替换后遗失
+                self._drain_queue_sync(old_queue)
+            DiaryStorage._write_queue = asyncio.Queue()
+            DiaryStorage._writer_task = loop.create_task(self._writer_loop(DiaryStorage._write_queue))
+        return DiaryStorage._write_queue
+    
+    async def _writer_loop(self, queue: asyncio.Queue):
+        """
+        后台写入循环
+        
+        等待第一条写入请求后，把队列中已积压的请求（最多_WRITE_BATCH_MAX条）
+        合并为一批，在工作线程中写入并只更新一次索引，再逐条通知调用方。
+        任务被取消（插件卸载或事件循环关闭）时，等待正在写入的一批完成并通知调用方，
+        再把队列中剩余的请求同步写入后退出。
+        """
+        batch = []
+        write = None
         try:
-            index_data = {"last_update": time.time(), "total_diaries": 0, "success_count": 0, "failed_count": 0}
-            if os.path.exists(self.index_file):
-                with open(self.index_file, 'r', encoding='utf-8') as f:
-                    index_data = json.load(f)
+            while True:
+                if DiaryStorage._index_dirty_saves:
+                    # 索引有未落盘的修改：空闲超过落盘间隔后主动写入
+                    try:
+                        first = await asyncio.wait_for(queue.get(), self._INDEX_FLUSH_INTERVAL)
+                    except asyncio.TimeoutError:
+                        await asyncio.to_thread(self._flush_index_sync)
+                        continue
+                else:
+                    first = await queue.get()
+                batch = [first]
+                while len(batch) < self._WRITE_BATCH_MAX and not queue.empty():
+                    batch.append(queue.get_nowait())
+                
+                write = asyncio.ensure_future(
+                    asyncio.to_thread(self._write_batch_sync, [(path, data) for path, data, _ in batch])
+                )
+                try:
+                    # shield：任务被取消时写入结果仍可在取消处理中取得
+                    results = await asyncio.shield(write)
+                except Exception as e:
+                    results = [e] * len(batch)
+                self._settle_batch(queue, batch, results)
+                batch, write = [], None
+        except asyncio.CancelledError:
+            if batch:
+                # 工作线程无法取消，正在写入的一批会继续完成：等待其结果后再通知调用方
+                try:
+                    results = await write
+                except asyncio.CancelledError:
+                    results = None
+                except Exception as e:
+                    results = [e] * len(batch)
+                self._settle_batch(queue, batch, results)
+            self._drain_queue_sync(queue)
+            raise
+    
+    @staticmethod
+    def _settle_batch(queue: asyncio.Queue, batch: list, results: Optional[List[Optional[Exception]]]):
+        """
+        结清一批写入请求的队列计数并通知等待中的调用方
+        
+        results为None表示写入结果未知，此时取消调用方的等待，避免其永久挂起。
+        """
+        for index, (_, _, future) in enumerate(batch):
+            try:
+                queue.task_done()
+                if future.done():
+                    continue
+                if results is None:
+                    future.cancel()
+                elif results[index] is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(results[index])
+            except RuntimeError:
+                # 事件循环已关闭（进程退出阶段），调用方不再等待结果
+                pass
+    
+    def _drain_queue_sync(self, queue: asyncio.Queue):
+        """
+        把写入队列中剩余的请求同步写入并写入索引（阻塞调用）
+        
+        用于后台写入任务被取消或已不在运行、以及进程退出时，保证已提交的保存不丢失。
+        """
+        pending = []
+        while not queue.empty():
+            pending.append(queue.get_nowait())
+        if pending:
+            try:
+                results = self._write_batch_sync([(path, data) for path, data, _ in pending])
+            except Exception as e:
+                results = [e] * len(pending)
+            self._settle_batch(queue, pending, results)
+            logger.info(f"已同步写入队列中剩余的{len(pending)}条日记")
+        self._flush_index_sync()
+    
+    def _flush_on_exit(self):
+        """进程退出时把写入队列中剩余的日记和延迟的索引修改写盘"""
+        queue = DiaryStorage._write_queue
+        if queue is not None:
+            self._drain_queue_sync(queue)
+        else:
+            self._flush_index_sync()
+    
+    def _write_batch_sync(self, items: List[Tuple[str, Dict[str, Any]]]) -> List[Optional[Exception]]:
+        """
+        写入一批日记文件并增量更新索引（阻塞调用，需在工作线程中执行）
+        
+        Returns:
+            List[Optional[Exception]]: 与items一一对应，成功为None，失败为异常
+        """
+        results: List[Optional[Exception]] = []
+        with self._write_lock:
+            # 先确保索引已加载：首次全量扫描必须发生在写入新文件之前，否则会重复计数
+            try:
+                index_data = self._ensure_index()
+            except Exception as e:
+                logger.error(f"加载索引失败: {e}")
+                index_data = None
             
-            index_data["last_update"] = time.time()
+            try:
+                dir_mtime_before = os.stat(self.data_dir).st_mtime_ns
+            except OSError:
+                dir_mtime_before = None
+            new_filenames = []
             
-            if os.path.exists(self.data_dir):
-                all_files = [f for f in os.listdir(self.data_dir) if f.endswith('.json')]
-                success_count = 0
-                failed_count = 0
-                
-                for filename in all_files:
-                    file_path = os.path.join(self.data_dir, filename)
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            if data.get("is_published_qzone", False):
-                                success_count += 1
-                            else:
-                                failed_count += 1
-                    except:
-                        failed_count += 1
+            for file_path, diary_data in items:
+                try:
+                    previous = self._load_cached(file_path)
+                except FileNotFoundError:
+                    previous = None
+                except Exception:
+                    previous = {}  # 旧文件无法解析，按失败记录计数
                 
-                index_data["success_count"] = success_count
-                index_data["failed_count"] = failed_count
-                index_data["total_diaries"] = len(all_files)
+                try:
+                    self._write_json(file_path, diary_data)
+                except Exception as e:
+                    results.append(e)
+                    continue
+                self._invalidate_cached(file_path)
+                if previous is None:
+                    new_filenames.append(os.path.basename(file_path))
+                if index_data is not None:
+                    self._apply_index_delta(index_data, previous, diary_data, os.path.basename(file_path))
+                results.append(None)
             
-            with open(self.index_file, 'w', encoding='utf-8') as f:
-                json.dump(index_data, f, ensure_ascii=False, indent=2)
+            if any(error is None for error in results):
+                # 原子写入会在目录中创建并重命名临时文件，覆盖写也需要刷新记录的目录mtime
+                self._record_filenames(new_filenames, dir_mtime_before)
+                # 本批写入已增量计入内存索引：写入前索引与目录一致时同步记录新的目录mtime
+                if index_data is not None and dir_mtime_before == DiaryStorage._index_dir_mtime:
+                    DiaryStorage._index_dir_mtime = self._dir_mtime()
+            
+            if index_data is not None:
+                DiaryStorage._index_dirty_saves += sum(1 for error in results if error is None)
+                if (DiaryStorage._index_dirty_saves >= self._INDEX_FLUSH_EVERY
+                        or time.time() - DiaryStorage._last_index_flush >= self._INDEX_FLUSH_INTERVAL):
+                    self._write_index_locked()
+        return results
+    
+    def _write_index_locked(self):
+        """把内存索引写入index.json（调用方需持有_write_lock）"""
+        if DiaryStorage._index_cache is None:
+            return
+        try:
+            self._write_json(self.index_file, DiaryStorage._index_cache)
+            DiaryStorage._index_dirty_saves = 0
+            DiaryStorage._last_index_flush = time.time()
         except Exception as e:
-            logger.error(f"更新索引失败: {e}")
\ No newline at end of file
+            logger.error(f"更新索引失败: {e}")
+    
+    def _flush_index_sync(self):
+        """有未落盘的索引修改时立即写入（阻塞调用）"""
+        with self._write_lock:
+            if DiaryStorage._index_dirty_saves:
+                self._write_index_locked()
+    
+    async def flush(self):
+        """
+        等待写入队列中的日记全部落盘，并立即把延迟的索引修改写入index.json
+        
+        插件卸载前调用以保证数据持久化；进程退出时也会通过atexit自动执行。
+        后台写入任务不在当前事件循环中运行时，直接同步写入队列中剩余的请求。
+        """
+        queue, task = DiaryStorage._write_queue, DiaryStorage._writer_task
+        if queue is not None:
+            if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+                await queue.join()
+            else:
+                self._drain_queue_sync(queue)
+        await asyncio.to_thread(self._flush_index_sync)
+    
+    async def aclose(self):
+        """
+        排空写入队列并停止后台写入任务，插件卸载时调用；之后再次保存会重新启动写入任务
+        """
+        await self.flush()
+        task = DiaryStorage._writer_task
+        DiaryStorage._writer_task = None
+        DiaryStorage._write_queue = None
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    
+    @staticmethod
+    def _index_entry(diary: Dict[str, Any]) -> Dict[str, Any]:
+        """索引中单个日记文件的元数据"""
+        return {
+            "date": diary.get("date"),
+            "generation_time": diary.get("generation_time", 0) or 0,
+            "word_count": diary.get("word_count", 0) or 0,
+            "is_published_qzone": bool(diary.get("is_published_qzone", False))
+        }
+    
+    @staticmethod
+    def _apply_index_delta(index_data: Dict[str, Any], previous: Optional[Dict[str, Any]],
+                           current: Dict[str, Any], filename: str):
+        """
+        按单条保存增量调整索引计数和文件条目
+        
+        Args:
+            index_data: 内存中的索引
+            previous: 被覆盖的旧记录，新文件时为None
+            current: 新写入的记录
+            filename: 日记文件名
+        """
+        if previous is None:
+            index_data["total_diaries"] += 1
+        else:
+            if index_data["entries"].get(filename, {}).get("unreadable"):
+                # 覆盖了无法解析的旧文件
+                index_data["unreadable_count"] = max(0, index_data["unreadable_count"] - 1)
+            old_key = "success_count" if previous.get("is_published_qzone", False) else "failed_count"
+            index_data[old_key] = max(0, index_data[old_key] - 1)
+            index_data["total_words"] -= previous.get("word_count", 0) or 0
+        new_key = "success_count" if current.get("is_published_qzone", False) else "failed_count"
+        index_data[new_key] += 1
+        index_data["total_words"] += current.get("word_count", 0) or 0
+        
+        generation_time = current.get("generation_time", 0) or 0
+        if index_data["latest_date"] is None or generation_time >= index_data["latest_generation_time"]:
+            index_data["latest_generation_time"] = generation_time
+            index_data["latest_date"] = current.get("date", "无")
+        index_data["entries"][filename] = DiaryStorage._index_entry(current)
+        index_data["last_update"] = time.time()
+    
+    @staticmethod
+    def _empty_index() -> Dict[str, Any]:
+        """空索引（无任何日记时的统计）"""
+        return {
+            "last_update": time.time(),
+            "total_diaries": 0,
+            "success_count": 0,
+            "failed_count": 0,
+            "unreadable_count": 0,
+            "total_words": 0,
+            "latest_generation_time": 0,
+            "latest_date": None,
+            "entries": {}
+        }
+    
+    def _index_snapshot(self) -> Dict[str, Any]:
+        """获取索引的一致性副本（阻塞调用，需在工作线程中执行）"""
+        with self._write_lock:
+            return dict(self._ensure_index())
+    
+    def _dir_mtime(self) -> Optional[int]:
+        """日记目录的mtime（纳秒），目录不存在时返回None"""
+        try:
+            return os.stat(self.data_dir).st_mtime_ns
+        except OSError:
+            return None
+    
+    def _ensure_index(self) -> Dict[str, Any]:
+        """
+        获取内存中的索引（调用方需持有_write_lock）
+        
+        首次调用时从index.json加载；文件缺失、损坏、缺少计数字段或文件条目（旧版索引），
+        或记录的日记总数与实际文件数不符（延迟落盘期间异常退出）时全量重建。
+        之后每次调用比较日记目录mtime，目录在本进程之外被增删文件时同样全量重建。
+        """
+        dir_mtime = self._dir_mtime()
+        if DiaryStorage._index_cache is not None and dir_mtime != DiaryStorage._index_dir_mtime:
+            logger.info("检测到日记目录被外部修改,重建索引")
+            index_data = self._scan_index()
+            self._write_json(self.index_file, index_data)
+            DiaryStorage._index_cache = index_data
+            DiaryStorage._index_dirty_saves = 0
+            DiaryStorage._last_index_flush = time.time()
+        elif DiaryStorage._index_cache is None:
+            index_data = None
+            if os.path.exists(self.index_file):
+                try:
+                    index_data = self._read_json(self.index_file)
+                except Exception as e:
+                    logger.warning(f"索引文件损坏,将重建: {e}")
+            if (not isinstance(index_data, dict)
+                    or any(key not in index_data for key in self._empty_index())
+                    or index_data["total_diaries"] != len(self._list_filenames())):
+                index_data = self._scan_index()
+                self._write_json(self.index_file, index_data)
+            DiaryStorage._index_cache = index_data
+            DiaryStorage._last_index_flush = time.time()
+        DiaryStorage._index_dir_mtime = dir_mtime
+        return DiaryStorage._index_cache
+    
+    def _scan_index(self) -> Dict[str, Any]:
+        """全量扫描日记目录统计索引（阻塞调用，需在工作线程中执行）"""
+        index_data = self._empty_index()
+        try:
+            with os.scandir(self.data_dir) as it:
+                entries = [entry for entry in it if entry.name.endswith(DIARY_FILE_SUFFIX) and entry.is_file()]
+        except FileNotFoundError:
+            return index_data
+        
+        for entry in entries:
+            try:
+                data = self._load_cached(entry.path, entry.stat())
+            except Exception:
+                # 无法解析的文件计入总数和失败数，并单独计数以便统计时排除
+                index_data["total_diaries"] += 1
+                index_data["failed_count"] += 1
+                index_data["unreadable_count"] += 1
+                index_entry = self._index_entry({"date": self._filename_date_key(entry.name)})
+                index_entry["unreadable"] = True
+                index_data["entries"][entry.name] = index_entry
+                continue
+            self._apply_index_delta(index_data, None, data, entry.name)
+        return index_data
+    
+    def _rebuild_index_sync(self) -> Dict[str, Any]:
+        """全量重建索引并写盘（阻塞调用，需在工作线程中执行）"""
+        with self._write_lock:
+            dir_mtime = self._dir_mtime()
+            index_data = self._scan_index()
+            self._write_json(self.index_file, index_data)
+            DiaryStorage._index_cache = index_data
+            DiaryStorage._index_dir_mtime = dir_mtime
+            DiaryStorage._index_dirty_saves = 0
+            DiaryStorage._last_index_flush = time.time()
+            return dict(index_data)
+    
+    async def rebuild_index(self) -> Dict[str, Any]:
+        """
+        全量扫描日记目录重建索引
+        
+        正常保存路径只做增量更新；日记文件被手动增删后可调用此方法校正计数。
+        
+        Returns:
+            Dict[str, Any]: 重建后的索引数据
+        """
+        return await asyncio.to_thread(self._rebuild_index_sync)
@@ -7,22 +7,144 @@
 - ChatIdResolver: 聊天ID解析器，将用户友好的配置转换为真实的聊天ID
 - DiaryConstants: 日记插件常量定义
 - MockChatStream: 虚拟聊天流，用于定时任务中的Action初始化
+- read_json_file / write_json_file: JSON文件读写（可用时使用orjson加速）
 """
 
 import os
+import re
 import json
 import time
+import datetime
 import hashlib
-from typing import List, Tuple, Optional, Any,Dict,Callable
+import functools
+from typing import List, Tuple, Optional, Any,Dict,Callable, Final
 
 from src.chat.message_receive import message
 from src.chat.message_receive.chat_stream import ChatStream
-from src.plugin_system.apis import get_logger, message_api, config_api,generator_api
+from src.plugin_system.apis import get_logger, config_api,generator_api
+
+try:
+    import orjson  # 可选依赖：C实现的JSON解析/序列化
+except ImportError:
+    orjson = None
+
+try:
+    from peewee import PeeweeException  # ChatStreams所用ORM的异常基类
+except ImportError:
+    PeeweeException = Exception
+
+# 聊天ID查询只吞掉数据库/导入/取值类错误，其余异常照常抛出，避免掩盖真实缺陷
+_DB_ERRORS: Final[Tuple[type, ...]] = (PeeweeException, ImportError, ValueError)
+
+try:
+    from src.common.database.database_model import ChatStreams as _ChatStreams
+except ImportError:  # 数据库模块尚未就绪（如循环导入）时推迟到首次使用
+    _ChatStreams = None
 
 
 logger = get_logger("diary_plugin.utils")
 
 
+def _get_chat_streams_model():
+    """返回ChatStreams模型类，模块导入时未能加载则在首次调用时导入并缓存"""
+    global _ChatStreams
+    if _ChatStreams is None:
+        from src.common.database.database_model import ChatStreams
+        _ChatStreams = ChatStreams
+    return _ChatStreams
+
+
+# 设置环境变量 DEBUG_PRETTY_JSON=1 时写出带缩进的JSON，便于人工查看；默认写紧凑格式
+PRETTY_JSON: Final[bool] = os.environ.get("DEBUG_PRETTY_JSON", "") not in ("", "0")
+
+
+def close_thread_db_connection():
+    """
+    关闭当前线程的数据库连接
+    
+    peewee按线程保存连接，工作线程（asyncio.to_thread）中执行的查询会各自打开一个连接，
+    宿主只管理主线程的连接。在工作线程中查询完毕后调用，避免连接滞留和SQLite锁竞争；
+    之后该线程再次查询时peewee会自动重新连接。
+    """
+    try:
+        database = _get_chat_streams_model()._meta.database
+        if not database.is_closed():
+            database.close()
+    except (*_DB_ERRORS, AttributeError) as e:
+        logger.debug(f"关闭工作线程数据库连接失败: {e}")
+
+
+def run_with_thread_db_cleanup(func: Callable, *args, **kwargs) -> Any:
+    """执行同步查询后关闭当前线程的数据库连接，供asyncio.to_thread调用"""
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_thread_db_connection()
+
+
+def read_json_file(file_path: str) -> Any:
+    """
+    读取并解析JSON文件
+    
+    一次性以二进制方式读入，跳过文本解码层；安装了orjson时用orjson解析，
+    否则回退到标准库json（json.loads可直接接受UTF-8字节串）。
+    
+    Args:
+        file_path (str): 文件路径
+    
+    Returns:
+        Any: 解析结果
+    """
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def write_json_file(file_path: str, data: Any, indent: Optional[bool] = None):
+    """
+    序列化并原子地写入JSON文件（UTF-8，不转义非ASCII字符）
+    
+    先写入同目录下的 .tmp 临时文件并fsync，再用os.replace替换目标文件，
+    读取方要么看到旧文件要么看到完整的新文件，不会读到写了一半的JSON。
+    安装了orjson时用orjson序列化，遇到orjson不支持的数据类型时回退到标准库json。
+    
+    Args:
+        file_path (str): 文件路径
+        data (Any): 待写入的数据
+        indent (Optional[bool]): 是否以2空格缩进输出，None时由DEBUG_PRETTY_JSON决定
+    """
+    if indent is None:
+        indent = PRETTY_JSON
+    payload = None
+    if orjson is not None:
+        try:
+            payload = orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0)
+        except TypeError:
+            payload = None
+    if payload is None:
+        if indent:
+            text = json.dumps(data, ensure_ascii=False, indent=2)
+        else:
+            text = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        payload = text.encode('utf-8')
+    
+    tmp_path = f"{file_path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
 async def style_send(chat_stream: ChatStream, text: str, send_func: Callable):
     result_status, data = await generator_api.rewrite_reply(
         chat_stream=chat_stream,
@@ -38,12 +160,18 @@ async def style_send(chat_stream: ChatStream, text: str, send_func: Callable):
             await send_func(send_data)
 
     
+# 人设信息的进程内缓存：(获取时间, 人设字典)；配置可能热更新，因此只短期缓存
+PERSONALITY_CACHE_TTL: Final[int] = 60
+_personality_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+
+
 async def get_bot_personality() -> Dict[str, str]:
     """
-    实时获取bot人设信息
+    获取bot人设信息
     
     从全局配置中获取Bot的人格设置，用于生成个性化的日记内容。
-    适配MaiBot 0.10.2版本的新配置项结构。
+    适配MaiBot 0.10.2版本的新配置项结构。结果在进程内缓存PERSONALITY_CACHE_TTL秒，
+    批量生成多天日记时不再重复读取配置；每次返回新的字典，调用方可自由修改。
     
     Returns:
         Dict[str, str]: 包含Bot人设信息的字典，包含以下键：
@@ -57,20 +185,54 @@ async def get_bot_personality() -> Dict[str, str]:
         >>> print(personality['core'])  # "是一个活泼可爱的AI助手"
         >>> print(personality['style'])  # "温和友善，偶尔调皮"
     """
+    global _personality_cache
+    now = time.time()
+    if _personality_cache and now - _personality_cache[0] < PERSONALITY_CACHE_TTL:
+        return dict(_personality_cache[1])
+    
     personality = config_api.get_global_config("personality.personality", "是一个机器人助手")
     reply_style = config_api.get_global_config("personality.reply_style", "")
     interest = config_api.get_global_config("personality.interest", "")
     nickname = config_api.get_global_config("bot.nickname", "")
     alias_names = config_api.get_global_config("bot.alias_names", [])
     
-    return {
+    personality_info = {
         "core": personality,
         "style": reply_style,
         "interest": interest,
         "nickname": nickname,
         "alias_names": alias_names
     }
+    _personality_cache = (now, personality_info)
+    return dict(personality_info)
+
+
 
+# format_date_str 使用的预编译正则与候选格式
+_CANONICAL_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_LOOSE_DATE_RE = re.compile(r'^\d{4}-\d{1,2}-\d{1,2}$')
+_DATE_FORMATS: Final[Tuple[str, ...]] = ("%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d")
+
+
+@functools.lru_cache(maxsize=1024)
+def _normalize_date_string(date_str: str) -> Optional[str]:
+    """将非规范的日期字符串转换为YYYY-MM-DD（结果按输入缓存），无法识别时返回None"""
+    try:
+        # 尝试多种日期格式
+        for fmt in _DATE_FORMATS:
+            try:
+                date_obj = datetime.datetime.strptime(date_str, fmt)
+                return date_obj.strftime("%Y-%m-%d")
+            except ValueError:
+                continue
+        
+        # 如果已经是正确格式，直接返回
+        if _LOOSE_DATE_RE.match(date_str):
+            return date_str
+            
+    except Exception as e:
+        logger.debug(f"日期格式化失败: {e}")
+    return None
 
 
 def format_date_str(date_input: Any) -> str:
@@ -95,27 +257,15 @@ def format_date_str(date_input: Any) -> str:
         >>> format_date_str(datetime.datetime(2025, 8, 24))
         "2025-08-24"
     """
-    import datetime
-    import re
-    
     if isinstance(date_input, datetime.datetime):
         return date_input.strftime("%Y-%m-%d")
     elif isinstance(date_input, str):
-        try:
-            # 尝试多种日期格式
-            for fmt in ["%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d"]:
-                try:
-                    date_obj = datetime.datetime.strptime(date_input, fmt)
-                    return date_obj.strftime("%Y-%m-%d")
-                except ValueError:
-                    continue
-            
-            # 如果已经是正确格式，直接返回
-            if re.match(r'^\d{4}-\d{1,2}-\d{1,2}$', date_input):
-                return date_input
-                
-        except Exception as e:
-            logger.debug(f"日期格式化失败: {e}")
+        # 最常见的情况：已经是补零的YYYY-MM-DD，直接返回
+        if _CANONICAL_DATE_RE.match(date_input):
+            return date_input
+        normalized = _normalize_date_string(date_input)
+        if normalized is not None:
+            return normalized
     
     # 不再使用后备方案，而是抛出异常
     error_msg = f"无法识别的日期格式: {date_input}。支持的格式有: YYYY-MM-DD, YYYY/MM/DD, YYYY.MM.DD"
@@ -123,6 +273,46 @@ def format_date_str(date_input: Any) -> str:
     raise ValueError(error_msg)
 
 
+# 模块级常量：调用方可直接导入，避免热路径上的类属性查找
+MIN_MESSAGE_COUNT: Final[int] = 3
+TOKEN_LIMIT_50K: Final[int] = 50000
+TOKEN_LIMIT_126K: Final[int] = 126000
+MAX_DIARY_LENGTH: Final[int] = 8000
+DEFAULT_QZONE_WORD_COUNT: Final[int] = 300
+
+# target_chats 配置项前缀
+GROUP_PREFIX: Final[str] = "group:"
+PRIVATE_PREFIX: Final[str] = "private:"
+
+# 时间线按小时分组的标题（下标为小时），避免每条消息重复分支判断和格式化
+TIMELINE_HOUR_HEADERS: Final[Tuple[str, ...]] = tuple(
+    f"\n【{'上午' if 6 <= hour < 12 else '下午' if 12 <= hour < 18 else '晚上'}{hour}点】"
+    for hour in range(24)
+)
+
+# get_weather_by_emotion 使用的情感词表：统计的是命中的不同词数，而非出现次数
+WEATHER_HAPPY_WORDS: Final[Tuple[str, ...]] = ("哈哈", "笑", "开心", "高兴", "棒", "好", "赞", "爱", "喜欢")
+WEATHER_SAD_WORDS: Final[Tuple[str, ...]] = ("难过", "伤心", "哭", "痛苦", "失望")
+WEATHER_ANGRY_WORDS: Final[Tuple[str, ...]] = ("无语", "醉了", "服了", "烦", "气", "怒")
+WEATHER_CALM_WORDS: Final[Tuple[str, ...]] = ("平静", "安静", "淡定", "还好", "一般")
+
+# 聊天ID（stream_id，通常为32位十六进制摘要）的最短合理长度，用于验证前的结构预检
+MIN_CHAT_ID_LENGTH: Final[int] = 8
+
+# 聊天ID映射缓存文件路径（模块导入时计算一次）
+_CHAT_MAPPING_FILE: Final[str] = os.path.normpath(
+    os.path.join(os.path.dirname(__file__), "..", "data", "chat_mapping.json")
+)
+
+# 过滤模式 -> (列表非空时的策略, 列表为空时的策略, 非空日志, 空列表日志)
+_FILTER_STRATEGIES: Final[Dict[str, Tuple[str, str, str, str]]] = {
+    "whitelist": ("PROCESS_WHITELIST", "DISABLE_SCHEDULER",
+                  "白名单模式:处理指定的{count}个聊天", "白名单模式:空列表,禁用定时任务"),
+    "blacklist": ("PROCESS_BLACKLIST", "PROCESS_ALL",
+                  "黑名单模式:排除指定的{count}个聊天", "黑名单模式:空列表,处理全部聊天"),
+}
+
+
 class DiaryConstants:
     """
     日记插件常量定义类
@@ -130,6 +320,8 @@ class DiaryConstants:
     包含日记插件运行所需的各种常量配置，如消息数量限制、
     token限制、日记长度限制等核心参数。
     
+    常量本体定义在模块级（typing.Final），本类仅作为兼容旧代码的命名空间保留。
+    
     Attributes:
         MIN_MESSAGE_COUNT (int): 生成日记所需的最少消息数量
         TOKEN_LIMIT_50K (int): 50K token限制
@@ -137,11 +329,11 @@ class DiaryConstants:
         MAX_DIARY_LENGTH (int): 日记最大长度限制
         DEFAULT_QZONE_WORD_COUNT (int): QQ空间默认字数
     """
-    MIN_MESSAGE_COUNT = 3
-    TOKEN_LIMIT_50K = 50000
-    TOKEN_LIMIT_126K = 126000
-    MAX_DIARY_LENGTH = 8000
-    DEFAULT_QZONE_WORD_COUNT = 300
+    MIN_MESSAGE_COUNT: Final[int] = MIN_MESSAGE_COUNT
+    TOKEN_LIMIT_50K: Final[int] = TOKEN_LIMIT_50K
+    TOKEN_LIMIT_126K: Final[int] = TOKEN_LIMIT_126K
+    MAX_DIARY_LENGTH: Final[int] = MAX_DIARY_LENGTH
+    DEFAULT_QZONE_WORD_COUNT: Final[int] = DEFAULT_QZONE_WORD_COUNT
 
 
 class MockChatStream:
@@ -159,10 +351,11 @@ class MockChatStream:
         user_info: 用户信息，定时任务中为None
     
     Usage:
-        >>> mock_stream = MockChatStream()
-        >>> action = SomeAction(chat_stream=mock_stream, ...)
+        >>> action = SomeAction(chat_stream=MOCK_CHAT_STREAM, ...)
     """
     
+    __slots__ = ("stream_id", "platform", "group_info", "user_info")
+    
     def __init__(self):
         """初始化虚拟聊天流"""
         self.stream_id = "diary_scheduled_task"
@@ -171,6 +364,10 @@ class MockChatStream:
         self.user_info = None
 
 
+# 共享的虚拟聊天流实例：各属性均为常量且无人修改，全局复用即可
+MOCK_CHAT_STREAM = MockChatStream()
+
+
 class ChatIdResolver:
     """
     聊天ID解析器 - 将用户友好的配置转换为真实的聊天ID
@@ -204,25 +401,59 @@ class ChatIdResolver:
     - 支持增量更新和完整重建
     """
     
+    # 缓存命中时跳过数据库验证的最长时间（秒）
+    REVALIDATE_INTERVAL = 3600
+    # 进程内解析结果缓存的有效期（秒）
+    RESOLUTION_TTL = 300
+    # 进程内共享的解析结果：(过滤模式, 按配置顺序的目标列表) -> (解析时间, 处理策略, 聊天ID列表（先群聊后私聊）)
+    _resolution_cache: Dict[Tuple[str, Tuple[Any, ...]], Tuple[float, str, List[str]]] = {}
+    
     def __init__(self):
-        self.cache_file = os.path.join(os.path.dirname(__file__), "..", "data", "chat_mapping.json")
-        self.cache = {}
+        self.cache_file = _CHAT_MAPPING_FILE
+        # 群号 -> 聊天ID、用户QQ号 -> 聊天ID 分别缓存，查找时无需拼接键名
+        self.group_cache: Dict[str, str] = {}
+        self.private_cache: Dict[str, str] = {}
         self.last_config_hash = ""
+        # 上次完整解析（含数据库验证）并写入缓存的时间戳
+        self._last_update = 0.0
+        # 已加载缓存文件的mtime，文件未变化时直接复用内存中的映射
+        self._cache_mtime = None
         
     def _get_config_hash(self, groups: List[str], privates: List[str]) -> str:
-        """计算配置的哈希值,用于检测配置变更"""
-        config_str = f"groups:{','.join(sorted(groups))};privates:{','.join(sorted(privates))}"
-        return hashlib.md5(config_str.encode()).hexdigest()
+        """计算配置的哈希值,用于检测配置变更（只需判等，使用8字节BLAKE2b即可）"""
+        h = hashlib.blake2b(digest_size=8)
+        h.update(b"g:")
+        h.update("\x00".join(sorted(groups)).encode())
+        h.update(b";p:")
+        h.update("\x00".join(sorted(privates)).encode())
+        return h.hexdigest()
     
     def _load_cache(self) -> bool:
-        """加载缓存文件"""
+        """加载缓存文件（文件mtime未变化时不重复读取解析）"""
         try:
-            if os.path.exists(self.cache_file):
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    cache_data = json.load(f)
-                    self.cache = cache_data.get("mapping", {})
-                    self.last_config_hash = cache_data.get("config_hash", "")
-                    return True
+            try:
+                mtime = os.stat(self.cache_file).st_mtime_ns
+            except FileNotFoundError:
+                return False
+            if mtime == self._cache_mtime:
+                return True
+            cache_data = read_json_file(self.cache_file)
+            if "groups" in cache_data or "privates" in cache_data:
+                self.group_cache = cache_data.get("groups", {})
+                self.private_cache = cache_data.get("privates", {})
+            else:
+                # 兼容旧格式：{"mapping": {"group_群号": ID, "private_QQ号": ID}}
+                self.group_cache, self.private_cache = {}, {}
+                for key, chat_id in cache_data.get("mapping", {}).items():
+                    kind, _, number = key.partition("_")
+                    if kind == "group":
+                        self.group_cache[number] = chat_id
+                    elif kind == "private":
+                        self.private_cache[number] = chat_id
+            self.last_config_hash = cache_data.get("config_hash", "")
+            self._last_update = cache_data.get("last_update", 0.0)
+            self._cache_mtime = mtime
+            return True
         except Exception as e:
             logger.error(f"加载聊天ID缓存失败: {e}")
         return False
@@ -232,104 +463,130 @@ class ChatIdResolver:
         try:
             os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
             cache_data = {
-                "mapping": self.cache,
+                "groups": self.group_cache,
+                "privates": self.private_cache,
                 "config_hash": config_hash,
                 "last_update": time.time()
             }
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, ensure_ascii=False, indent=2)
+            # 原子写入紧凑JSON，崩溃时不会留下写了一半的缓存文件
+            write_json_file(self.cache_file, cache_data)
+            # 内存中已是最新内容，记录新mtime以免下次解析时重新读取
+            self.last_config_hash = config_hash
+            self._last_update = cache_data["last_update"]
+            self._cache_mtime = os.stat(self.cache_file).st_mtime_ns
         except Exception as e:
             logger.error(f"保存聊天ID缓存失败: {e}")
     
-    def _query_chat_id_from_database(self, qq_number: str, is_group: bool) -> Optional[str]:
-        """从数据库查询聊天ID"""
+    def _bulk_query_chat_ids(self, qq_numbers: List[str], is_group: bool) -> Dict[str, str]:
+        """
+        批量从数据库查询聊天ID
+        
+        一次 IN 查询取回所有号码对应的 stream_id，返回 {号码: 聊天ID}；
+        同一号码存在多条记录时保留首条，与 get_or_none 的行为一致。
+        """
+        if not qq_numbers:
+            return {}
         try:
-            from src.common.database.database_model import ChatStreams
+            ChatStreams = _get_chat_streams_model()
             
+            numbers = [str(qq) for qq in qq_numbers]
             if is_group:
                 # 查找群聊
-                stream = ChatStreams.get_or_none(ChatStreams.group_id == str(qq_number))
+                query = ChatStreams.select(ChatStreams.group_id, ChatStreams.stream_id).where(
+                    ChatStreams.group_id.in_(numbers)
+                )
+                key_attr = "group_id"
             else:
                 # 查找私聊（user_id匹配且group_id为空）
-                stream = ChatStreams.get_or_none(
-                    (ChatStreams.user_id == str(qq_number)) & 
+                query = ChatStreams.select(ChatStreams.user_id, ChatStreams.stream_id).where(
+                    (ChatStreams.user_id.in_(numbers)) &
                     (ChatStreams.group_id.is_null() | (ChatStreams.group_id == ""))
                 )
+                key_attr = "user_id"
+            if len(numbers) == 1:
+                # 单个号码只需首条记录（与 get_or_none 相同），不必取回全部重复行
+                query = query.limit(1)
             
-            return stream.stream_id if stream else None
-        except Exception as e:
-            logger.error(f"查询聊天ID失败 ({qq_number}, {'群聊' if is_group else '私聊'}): {e}")
-            return None
+            result = {}
+            for stream in query:
+                result.setdefault(str(getattr(stream, key_attr)), stream.stream_id)
+            return result
+        except _DB_ERRORS as e:
+            logger.error(f"批量查询聊天ID失败 ({'群聊' if is_group else '私聊'}, {len(qq_numbers)}个): {e}")
+            return {}
     
-    def _validate_chat_id(self, chat_id: str) -> bool:
-        """验证聊天ID是否有效"""
+    def _query_chat_id_from_database(self, qq_number: str, is_group: bool) -> Optional[str]:
+        """从数据库查询单个聊天ID"""
+        return self._bulk_query_chat_ids([qq_number], is_group).get(str(qq_number))
+    
+    def _validate_chat_ids(self, chat_ids: List[str]) -> set:
+        """
+        批量验证聊天ID是否有效
+        
+        用一次 stream_id IN (...) 查询代替逐个探测，返回其中确实存在的聊天ID集合。
+        查询出错时全部视为无效：调用方会重新查询映射，且不会把未经验证的ID写回缓存。
+        """
+        # 结构上不可能有效的ID（非字符串、空串或过短，多见于数据库重置后的残留缓存）直接判为无效
+        candidates = [chat_id for chat_id in chat_ids if self._looks_like_chat_id(chat_id)]
+        if not candidates:
+            return set()
         try:
-            # 尝试获取该聊天的消息来验证ID有效性
-            test_messages = message_api.get_messages_by_time_in_chat(
-                chat_id=chat_id,
-                start_time=0,
-                end_time=time.time(),
-                limit=1,
-                filter_mai=False,
-                filter_command=False
-            )
-            return True  # 能成功调用就说明chat_id有效
-        except Exception:
+            ChatStreams = _get_chat_streams_model()
+            
+            query = ChatStreams.select(ChatStreams.stream_id).where(ChatStreams.stream_id.in_(candidates))
+            return {row.stream_id for row in query}
+        except _DB_ERRORS as e:
+            logger.error(f"批量验证聊天ID失败: {e}")
+            return set()
+    
+    @staticmethod
+    def _looks_like_chat_id(chat_id: Any) -> bool:
+        """聊天ID的结构预检：必须是长度不小于MIN_CHAT_ID_LENGTH的字符串"""
+        return isinstance(chat_id, str) and len(chat_id) >= MIN_CHAT_ID_LENGTH
+    
+    def _validate_chat_id(self, chat_id: str) -> bool:
+        """验证单个聊天ID是否有效（结构预检不通过时不查询数据库）"""
+        if not self._looks_like_chat_id(chat_id):
             return False
+        return chat_id in self._validate_chat_ids([chat_id])
     
-    def resolve_filter_mode(self, filter_mode: str, target_chats: List[str], _recursion_depth: int = 0) -> Tuple[str, List[str]]:
+    def resolve_filter_mode(self, filter_mode: str, target_chats: List[str]) -> Tuple[str, List[str]]:
         """
-        根据过滤模式和目标列表解析处理策略，防止无限递归
+        根据过滤模式和目标列表解析处理策略
         
         这是一个公共方法，用于解析用户配置的过滤模式并返回相应的处理策略。
-        支持白名单、黑名单两种过滤模式，并提供递归保护机制。
+        支持白名单、黑名单两种过滤模式，未知模式按白名单处理。
         
         Args:
             filter_mode (str): 过滤模式，可选值为"whitelist"或"blacklist"
             target_chats (List[str]): 目标聊天配置列表
-            _recursion_depth (int): 递归深度，用于防止无限递归
         
         Returns:
             Tuple[str, List[str]]: (处理策略, 有效配置列表)
         """
-        # 防止无限递归，最大递归深度限制为1
-        if _recursion_depth > 1:
-            logger.error(f"过滤模式解析递归过深，使用默认处理")
-            return "PROCESS_ALL", []
-        
-        # 根据过滤模式处理
-        if filter_mode == "whitelist":
-            if target_chats:
-                logger.debug(f"白名单模式:处理指定的{len(target_chats)}个聊天")
-                return "PROCESS_WHITELIST", target_chats
-            else:
-                logger.debug("白名单模式:空列表,禁用定时任务")
-                return "DISABLE_SCHEDULER", []
-    
-        elif filter_mode == "blacklist":
-            if target_chats:
-                logger.debug(f"黑名单模式:排除指定的{len(target_chats)}个聊天")
-                return "PROCESS_BLACKLIST", target_chats
-            else:
-                logger.debug("黑名单模式:空列表,处理全部聊天")
-                return "PROCESS_ALL", []
-        
-        else:
+        if filter_mode not in _FILTER_STRATEGIES:
             logger.warning(f"未知的过滤模式: {filter_mode},使用默认白名单模式")
-            return self.resolve_filter_mode("whitelist", target_chats, _recursion_depth + 1)
+            filter_mode = "whitelist"
+        
+        hit, miss, hit_msg, miss_msg = _FILTER_STRATEGIES[filter_mode]
+        if target_chats:
+            logger.debug(hit_msg.format(count=len(target_chats)))
+            return hit, target_chats
+        logger.debug(miss_msg)
+        return miss, []
     
     def _parse_target_config(self, target_chats: List[str]) -> Tuple[List[str], List[str]]:
         """解析target_chats配置为群聊和私聊列表"""
         groups = []
         privates = []
+        # 按"类型:号码"中的类型分桶，键与 GROUP_PREFIX / PRIVATE_PREFIX 对应
+        buckets = {GROUP_PREFIX[:-1]: groups, PRIVATE_PREFIX[:-1]: privates}
         
         for chat_config in target_chats:
-            if chat_config.startswith("group:"):
-                group_id = chat_config[6:]  # 移除"group:"前缀
-                groups.append(group_id)
-            elif chat_config.startswith("private:"):
-                user_id = chat_config[8:]  # 移除"private:"前缀
-                privates.append(user_id)
+            kind, sep, number = chat_config.partition(":")
+            bucket = buckets.get(kind) if sep else None
+            if bucket is not None:
+                bucket.append(number)
             else:
                 logger.warning(f"无效的聊天配置格式: {chat_config}")
         
@@ -348,7 +605,24 @@ class ChatIdResolver:
         
         Returns:
             Tuple[str, List[str]]: (处理策略, 解析后的聊天ID列表)
+        
+        Note:
+            同一过滤模式与目标列表的解析结果在进程内缓存RESOLUTION_TTL秒，
+            期间重复调用（不同的ChatIdResolver实例也共享）不读缓存文件也不查询数据库。
         """
+        # 键保留配置顺序：解析结果先群聊后私聊，各自按配置中的先后排列，调整顺序后不能返回旧的排列
+        key = (filter_mode, tuple(target_chats or ()))
+        cached = ChatIdResolver._resolution_cache.get(key)
+        now = time.time()
+        if cached and now - cached[0] < self.RESOLUTION_TTL:
+            return cached[1], list(cached[2])
+        
+        strategy, chat_ids = self._resolve_target_chats_uncached(filter_mode, target_chats)
+        ChatIdResolver._resolution_cache[key] = (now, strategy, list(chat_ids))
+        return strategy, chat_ids
+    
+    def _resolve_target_chats_uncached(self, filter_mode: str, target_chats: List[str]) -> Tuple[str, List[str]]:
+        """按过滤模式完成一次完整解析（不经过进程内结果缓存）"""
         # 使用新的过滤模式解析
         strategy, valid_configs = self.resolve_filter_mode(filter_mode, target_chats)
         
@@ -380,47 +654,48 @@ class ChatIdResolver:
         self._load_cache()
         config_changed = (current_config_hash != self.last_config_hash)
         
-        valid_chat_ids = []
+        # 快速路径：配置未变、所有条目均已缓存且距上次验证不足 REVALIDATE_INTERVAL，直接返回缓存结果
+        if (not config_changed
+                and time.time() - self._last_update < self.REVALIDATE_INTERVAL
+                and all(qq in self.group_cache for qq in groups)
+                and all(qq in self.private_cache for qq in privates)):
+            return [self.group_cache[qq] for qq in groups] + [self.private_cache[qq] for qq in privates]
         
-        # 处理群聊配置
-        for group_qq in groups:
-            cache_key = f"group_{group_qq}"
-            
-            # 优先使用缓存
-            if not config_changed and cache_key in self.cache:
-                cached_chat_id = self.cache[cache_key]
-                if self._validate_chat_id(cached_chat_id):
-                    valid_chat_ids.append(cached_chat_id)
-                    continue
-            
-            # 缓存失效或不存在,重新查询
-            chat_id = self._query_chat_id_from_database(group_qq, True)
-            if chat_id and self._validate_chat_id(chat_id):
-                valid_chat_ids.append(chat_id)
-                self.cache[cache_key] = chat_id
-                logger.debug(f"群聊映射: {group_qq} → {chat_id}")
-            else:
-                logger.debug(f"未找到群 {group_qq} 的聊天记录,可能尚未加入该群")
+        caches = {True: self.group_cache, False: self.private_cache}
+        entries = [(qq, True) for qq in groups] + [(qq, False) for qq in privates]
         
-        # 处理私聊配置
-        for user_qq in privates:
-            cache_key = f"private_{user_qq}"
-            
+        # 一次批量查询验证所有缓存命中的聊天ID
+        cached_ids = {}
+        if not config_changed:
+            cached_ids = {(qq, g): caches[g][qq] for qq, g in entries if qq in caches[g]}
+        valid_cached = self._validate_chat_ids(list(cached_ids.values())) if cached_ids else set()
+        
+        # 缓存失效或不存在的条目,按群聊/私聊各用一次批量查询补齐
+        # （查询结果来自ChatStreams表，本身即证明存在，无需再验证）
+        misses = [entry for entry in entries if cached_ids.get(entry) not in valid_cached]
+        queried = {
+            True: self._bulk_query_chat_ids([qq for qq, g in misses if g], True),
+            False: self._bulk_query_chat_ids([qq for qq, g in misses if not g], False),
+        }
+        
+        valid_chat_ids = []
+        for entry in entries:
+            qq_number, is_group = entry
             # 优先使用缓存
-            if not config_changed and cache_key in self.cache:
-                cached_chat_id = self.cache[cache_key]
-                if self._validate_chat_id(cached_chat_id):
-                    valid_chat_ids.append(cached_chat_id)
-                    continue
+            cached_chat_id = cached_ids.get(entry)
+            if cached_chat_id is not None and cached_chat_id in valid_cached:
+                valid_chat_ids.append(cached_chat_id)
+                continue
             
-            # 缓存失效或不存在,重新查询
-            chat_id = self._query_chat_id_from_database(user_qq, False)
-            if chat_id and self._validate_chat_id(chat_id):
+            chat_id = queried[is_group].get(str(qq_number))
+            if chat_id:
                 valid_chat_ids.append(chat_id)
-                self.cache[cache_key] = chat_id
-                logger.debug(f"私聊映射: {user_qq} → {chat_id}")
+                caches[is_group][qq_number] = chat_id
+                logger.debug(f"{'群聊' if is_group else '私聊'}映射: {qq_number} → {chat_id}")
+            elif is_group:
+                logger.debug(f"未找到群 {qq_number} 的聊天记录,可能尚未加入该群")
             else:
-                logger.debug(f"未找到用户 {user_qq} 的聊天记录,可能尚未建立私聊")
+                logger.debug(f"未找到用户 {qq_number} 的聊天记录,可能尚未建立私聊")
         
         # 保存更新后的缓存
         if config_changed or valid_chat_ids:
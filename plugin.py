@@ -22,10 +22,12 @@ Version: 2.1.0
 
 import asyncio
 import datetime
-from typing import List, Tuple, Type
+from typing import List, Optional, Tuple, Type
 
 from src.plugin_system import (
     BasePlugin,
+    BaseEventHandler,
+    EventType,
     register_plugin,
     ComponentInfo,
     ConfigField
@@ -40,7 +42,8 @@ from .core import (
     DiaryGeneratorAction,
     DiaryManageCommand,
     DiaryScheduler,
-    DiaryStorage
+    DiaryStorage,
+    DiaryQzoneAPI
 )
 
 # 导入工具组件
@@ -48,6 +51,33 @@ from .core import EmotionAnalysisTool
 
 logger = get_logger("diary_plugin")
 
+# 插件初始化后延迟启动定时任务的秒数
+SCHEDULER_START_DELAY = 10
+
+
+class DiaryStopHandler(BaseEventHandler):
+    """
+    麦麦关闭事件处理器
+    
+    订阅ON_STOP事件，在宿主关闭事件循环之前调用DiaryPlugin.shutdown释放运行时资源。
+    """
+    
+    event_type = EventType.ON_STOP
+    handler_name = "diary_stop_handler"
+    handler_description = "麦麦关闭时停止日记定时任务并排空写入队列"
+    weight = 0
+    intercept_message = False
+    
+    async def execute(self, message):
+        plugin = DiaryPlugin._instance
+        if plugin is not None:
+            try:
+                await plugin.shutdown()
+            except Exception as e:
+                logger.error(f"释放日记插件资源失败: {e}")
+                return False, True, None, None, None
+        return True, True, None, None, None
+
 
 @register_plugin
 class DiaryPlugin(BasePlugin):
@@ -74,6 +104,7 @@ class DiaryPlugin(BasePlugin):
     - DiaryGeneratorAction: 日记生成Action
     - EmotionAnalysisTool: 情感分析工具
     - DiaryManageCommand: 日记管理命令
+    - DiaryStopHandler: 麦麦关闭时释放资源
     
     特性：
     - 自动启动定时任务调度器
@@ -88,6 +119,9 @@ class DiaryPlugin(BasePlugin):
     python_dependencies = ["httpx", "pytz", "openai"]
     config_file_name = "config.toml"
     
+    # 当前插件实例，由DiaryStopHandler在关闭时使用
+    _instance: Optional["DiaryPlugin"] = None
+    
     config_section_descriptions = {
         "plugin": "插件基础配置",
         "diary_generation": "日记生成相关配置",
@@ -164,7 +198,17 @@ class DiaryPlugin(BasePlugin):
         
         # 启动定时任务
         self.scheduler = DiaryScheduler(self)
-        asyncio.create_task(self._start_scheduler_after_delay())
+        self._scheduler_start_handle = None
+        self._scheduler_start_task = None
+        self._is_shut_down = False
+        # 供DiaryStopHandler在麦麦关闭时找到当前插件实例
+        DiaryPlugin._instance = self
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.logger.warning("当前没有运行中的事件循环,定时任务未启动")
+        else:
+            self._scheduler_start_handle = loop.call_later(SCHEDULER_START_DELAY, self._start_scheduler)
     
     def _log_plugin_status(self):
         """
@@ -174,11 +218,17 @@ class DiaryPlugin(BasePlugin):
         定时任务状态和模型配置等。用于插件启动时的状态检查。
         """
         try:
+            # 按配置节一次性读取，之后只做本地字典查找
+            plugin_cfg = self.get_config("plugin", {}) or {}
+            schedule_cfg = self.get_config("schedule", {}) or {}
+            model_cfg = self.get_config("custom_model", {}) or {}
+            qzone_cfg = self.get_config("qzone_publishing", {}) or {}
+            
             # 读取基本配置
-            admin_qqs = [str(admin_id) for admin_id in self.get_config("plugin.admin_qqs", [])]
-            filter_mode = self.get_config("schedule.filter_mode", "whitelist")
-            target_chats = self.get_config("schedule.target_chats", [])
-            use_custom_model = self.get_config("custom_model.use_custom_model", False)
+            admin_qqs = list(map(str, plugin_cfg.get("admin_qqs", [])))
+            filter_mode = schedule_cfg.get("filter_mode", "whitelist")
+            target_chats = schedule_cfg.get("target_chats", [])
+            use_custom_model = model_cfg.get("use_custom_model", False)
             
             # 显示管理员配置
             if admin_qqs:
@@ -199,7 +249,7 @@ class DiaryPlugin(BasePlugin):
                     self.logger.info("黑名单模式: 无排除列表,处理全部聊天,定时任务将启动")
             
             # 显示Napcat token配置状态
-            napcat_token = self.get_config("qzone_publishing.napcat_token", "")
+            napcat_token = qzone_cfg.get("napcat_token", "")
             if napcat_token:
                 self.logger.info("Napcat Token已配置,QQ空间发布功能启用安全验证")
             else:
@@ -207,8 +257,8 @@ class DiaryPlugin(BasePlugin):
             
             # 显示模型配置
             if use_custom_model:
-                model_name = self.get_config("custom_model.model_name", "未知模型")
-                api_key = self.get_config("custom_model.api_key", "")
+                model_name = model_cfg.get("model_name", "未知模型")
+                api_key = model_cfg.get("api_key", "")
                 if api_key and api_key != "your-rinko-key-here":
                     self.logger.info(f"自定义模型已启用: {model_name}")
                 else:
@@ -219,29 +269,59 @@ class DiaryPlugin(BasePlugin):
         except Exception as e:
             self.logger.error(f"读取插件配置失败: {e}")
     
-    async def _start_scheduler_after_delay(self):
+    def _start_scheduler(self):
         """
         延迟启动定时任务调度器
         
-        在插件初始化完成后，延迟10秒再启动定时任务，确保插件完全初始化
-        后再开始定时任务，避免初始化过程中的竞争条件。
-        
-        该方法通过asyncio.create_task在插件初始化时调用，是定时任务启动的
-        标准流程。
+        插件初始化时通过loop.call_later在SCHEDULER_START_DELAY秒后回调本方法，
+        确保插件完全初始化后再开始定时任务，避免初始化过程中的竞争条件；
+        等待期间不占用挂起的协程。
         
         Note:
             延迟10秒是为了确保所有插件组件都已正确初始化，特别是数据库
             连接和消息API等依赖服务已就绪。
         """
-        await asyncio.sleep(10)
+        self._scheduler_start_handle = None
+        if self.scheduler:
+            self._scheduler_start_task = asyncio.get_running_loop().create_task(self.scheduler.start())
+    
+    async def shutdown(self):
+        """
+        释放插件持有的运行时资源（可重复调用）
+        
+        麦麦关闭时由DiaryStopHandler（ON_STOP事件）调用：
+        取消尚未触发的延迟启动、停止定时任务、排空日记写入队列并写入索引，
+        最后关闭QQ空间API共享的HTTP连接池。
+        未经ON_STOP直接退出的进程由DiaryStorage注册的atexit回调兜底写盘。
+        """
+        if self._is_shut_down:
+            return
+        self._is_shut_down = True
+        
+        if self._scheduler_start_handle:
+            self._scheduler_start_handle.cancel()
+            self._scheduler_start_handle = None
+        start_task, self._scheduler_start_task = self._scheduler_start_task, None
+        if start_task is not None and not start_task.done():
+            # 启动尚未完成：等待其结束，避免在stop之后才注册定时器
+            try:
+                await start_task
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                self.logger.error(f"定时任务启动失败: {e}")
+        
         if self.scheduler:
-            await self.scheduler.start()
+            await self.scheduler.stop()
+        await self.storage.aclose()
+        await DiaryQzoneAPI.aclose()
+        self.logger.info("日记插件资源已释放")
 
     def get_plugin_components(self) -> List[Tuple[ComponentInfo, Type]]:
         """
         返回插件包含的组件列表
         
-        提供插件系统需要的组件信息，包括Action、Tool和Command组件。
+        提供插件系统需要的组件信息，包括Action、Tool、Command组件和关闭事件处理器。
         这些组件将被插件系统自动注册和管理。
         
         Returns:
@@ -249,6 +329,7 @@ class DiaryPlugin(BasePlugin):
                 - DiaryGeneratorAction: 日记生成Action组件
                 - EmotionAnalysisTool: 情感分析工具组件
                 - DiaryManageCommand: 日记管理命令组件
+                - DiaryStopHandler: 关闭事件处理器（始终注册）
         
         Note:
             所有组件都已在core模块中实现，本方法仅负责向插件系统注册
@@ -267,5 +348,6 @@ class DiaryPlugin(BasePlugin):
             components.append((EmotionAnalysisTool.get_tool_info(), EmotionAnalysisTool))
         if enable_command:
             components.append((DiaryManageCommand.get_command_info(), DiaryManageCommand))
+        components.append((DiaryStopHandler.get_handler_info(), DiaryStopHandler))
 
         return components
\ No newline at end of file